@@ -0,0 +1,26 @@
+"""Gunicorn hooks for the Prometheus metrics (see myus/myus/metrics.py)
+
+Every worker writes its metrics to files in PROMETHEUS_MULTIPROC_DIR, so that
+/metrics can add them up. It's only set here, for gunicorn and its workers:
+other processes, like management commands, would fail to write to it unless it
+was created first, and keep their metrics in memory instead. The directory is
+emptied when gunicorn starts, so counts from a previous run don't carry over,
+and an exited worker's live metrics are removed.
+"""
+
+import os
+import shutil
+
+os.environ.setdefault("PROMETHEUS_MULTIPROC_DIR", "/tmp/myus-metrics")
+
+
+def on_starting(server):
+    directory = os.environ["PROMETHEUS_MULTIPROC_DIR"]
+    shutil.rmtree(directory, ignore_errors=True)
+    os.makedirs(directory)
+
+
+def child_exit(server, worker):
+    from prometheus_client import multiprocess
+
+    multiprocess.mark_process_dead(worker.pid)
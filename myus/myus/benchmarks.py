@@ -0,0 +1,163 @@
+"""Microbenchmarks of the code that runs on every request
+
+Each benchmark times one small operation: answer normalization, the markdown
+and duration template filters, and fetching a leaderboard of 10, 100 and 1000
+teams. Results can be saved as a baseline and later runs compared against it;
+see the benchmark management command.
+
+The markdown filters cache their output, so they are timed both on a cache hit
+and on the rendering itself. The leaderboard teams are created in a
+transaction that is rolled back afterwards.
+"""
+
+import platform
+import timeit
+from datetime import timedelta
+
+from django.db import transaction
+from django.utils import timezone
+
+from .models import Hunt, Team, normalize_answer
+from .templatetags.duration import duration
+from .templatetags.markdown import clean, markdown, markdown_srcdoc
+
+LEADERBOARD_SIZES = [10, 100, 1000]
+
+SAMPLE_ANSWERS = [
+    "ANSWER",
+    "The Quick Brown Fox",
+    "  jumps-over_the LAZY dog!  ",
+    "Ünïcödé ÄNSWËR 123",
+]
+
+SAMPLE_MARKDOWN = """
+# The Puzzle
+
+Each of the clues below resolves to a **word**; read the *first letters* of
+the answers in order. See [the rules](https://example.com/rules) first, or
+write to https://example.com/contact.
+
+1. A small *rodent*, often found in houses (5)
+2. The opposite of *down* (2)
+3. What you do to a puzzle once it's solved (8)
+
+| Clue | Enumeration | Notes |
+|------|-------------|-------|
+| One  | (5)         | `mouse` isn't it |
+| Two  | (2)         | |
+
+> Note: the answer is a common English phrase.
+
+<img src="https://example.com/grid.png" width="300" alt="The grid">
+<script>alert("not allowed")</script>
+"""
+
+SAMPLE_HTML = (
+    '<p>Welcome to <b>the hunt</b>! Read the <a href="https://example.com" '
+    'onclick="steal()">rules</a> at https://example.com/rules.</p>'
+    '<script>alert("not allowed")</script>'
+    '<img src="https://example.com/logo.png" style="width: 50%" alt="Logo">'
+) * 4
+
+SAMPLE_DURATIONS = [
+    timedelta(seconds=59),
+    timedelta(hours=3, minutes=25, seconds=12),
+    timedelta(days=2, hours=1, seconds=1),
+]
+
+
+def _normalize_answers():
+    for answer in SAMPLE_ANSWERS:
+        normalize_answer(answer)
+
+
+def _durations():
+    for value in SAMPLE_DURATIONS:
+        duration(value)
+
+
+def _create_leaderboard(size):
+    hunt = Hunt.objects.create(name="Benchmark Hunt", slug="benchmark-hunt")
+    now = timezone.now()
+    Team.objects.bulk_create(
+        Team(
+            name=f"Team {i}",
+            hunt=hunt,
+            score=i % 37,
+            solve_count=i % 11,
+            last_solve=now - timedelta(minutes=i),
+            solve_time=timedelta(minutes=i % 97),
+        )
+        for i in range(size)
+    )
+    return hunt
+
+
+def benchmarks():
+    """Yield (name, function) for each benchmark, ready to be timed
+
+    Each function has to be timed before the next one is asked for.
+    """
+    yield "normalize_answer", _normalize_answers
+    yield "duration", _durations
+    yield "clean", lambda: clean(SAMPLE_HTML)
+    for render in [markdown, markdown_srcdoc]:
+        name = render.__name__
+        yield f"{name} (render)", lambda r=render: r.__wrapped__(SAMPLE_MARKDOWN)
+        yield f"{name} (cached)", lambda r=render: r(SAMPLE_MARKDOWN)
+
+    for size in LEADERBOARD_SIZES:
+        with transaction.atomic():
+            hunt = _create_leaderboard(size)
+            yield f"leaderboard ({size} teams)", lambda h=hunt: list(
+                h.leaderboard_teams()
+            )
+            transaction.set_rollback(True)
+
+
+def time_call(func, min_time=0.2, repeat=5):
+    """Seconds a call of func takes, at best over `repeat` rounds
+
+    Each round calls func enough times to take at least min_time seconds.
+    """
+    timer = timeit.Timer(func)
+    number = 1
+    while timer.timeit(number) < min_time:
+        number *= 2
+    return min(timer.repeat(repeat=repeat, number=number)) / number
+
+
+def run(name_filter=None, min_time=0.2, repeat=5):
+    """Time the benchmarks whose names contain name_filter, if given"""
+    results = {}
+    for name, func in benchmarks():
+        if name_filter and name_filter not in name:
+            continue
+        results[name] = time_call(func, min_time, repeat)
+    return results
+
+
+def environment():
+    """Where the benchmarks ran, to be saved with their results"""
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+    }
+
+
+def compare(results, baseline, threshold):
+    """Compare results to baseline results
+
+    Returns (name, seconds, baseline seconds or None, relative change or None,
+    whether it's a regression) for each result. A regression is a slowdown by
+    more than the threshold, e.g. 0.1 for 10%.
+    """
+    rows = []
+    for name, seconds in results.items():
+        before = baseline.get(name)
+        change = None if before is None else seconds / before - 1
+        rows.append(
+            (name, seconds, before, change, change is not None and change > threshold)
+        )
+    return rows
@@ -0,0 +1,80 @@
+"""Live hunt events (solves and the resulting leaderboard changes)
+
+Events are published per hunt through a broker and streamed to browsers by
+the hunt_events view. The broker class is chosen by the EVENT_BROKER setting;
+the default LocalBroker only reaches subscribers in the publishing process, so
+deployments with several processes need a broker backed by something shared.
+"""
+
+import asyncio
+import threading
+from collections import defaultdict
+from contextlib import asynccontextmanager
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+
+class LocalBroker:
+    """Delivers events to subscribers in the same process
+
+    publish() may be called from any thread; each subscriber receives events on
+    its own event loop. Subscribers that fall too far behind miss events rather
+    than holding them in memory.
+    """
+
+    max_queued_events = 100
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscribers = defaultdict(set)
+
+    def publish(self, hunt_id, event):
+        with self._lock:
+            subscribers = list(self._subscribers.get(hunt_id, ()))
+
+        for loop, queue in subscribers:
+            try:
+                loop.call_soon_threadsafe(self._deliver, queue, event)
+            except RuntimeError:
+                # the subscriber's loop has already closed
+                pass
+
+    @staticmethod
+    def _deliver(queue, event):
+        try:
+            queue.put_nowait(event)
+        except asyncio.QueueFull:
+            pass
+
+    @asynccontextmanager
+    async def subscribe(self, hunt_id):
+        subscriber = (
+            asyncio.get_running_loop(),
+            asyncio.Queue(maxsize=self.max_queued_events),
+        )
+        with self._lock:
+            self._subscribers[hunt_id].add(subscriber)
+        try:
+            yield subscriber[1]
+        finally:
+            with self._lock:
+                self._subscribers[hunt_id].discard(subscriber)
+                if not self._subscribers[hunt_id]:
+                    del self._subscribers[hunt_id]
+
+
+_broker = None
+_broker_lock = threading.Lock()
+
+
+def get_broker():
+    global _broker
+    with _broker_lock:
+        if _broker is None:
+            _broker = import_string(settings.EVENT_BROKER)()
+        return _broker
+
+
+def publish(hunt_id, event):
+    get_broker().publish(hunt_id, event)
@@ -112,6 +112,29 @@ class GuessForm(forms.Form):
     guess = forms.CharField()
 
 
+class GuessLogFilterForm(forms.Form):
+    team = forms.ModelChoiceField(
+        queryset=Team.objects.none(), required=False, empty_label="All teams"
+    )
+    correct = forms.NullBooleanField(
+        required=False,
+        widget=forms.Select(
+            choices=[("", "All guesses"), ("true", "Correct"), ("false", "Incorrect")]
+        ),
+    )
+
+    def __init__(self, hunt, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.fields["team"].queryset = hunt.teams.order_by("name")
+
+    def filter(self, guesses):
+        if self.cleaned_data["team"] is not None:
+            guesses = guesses.filter(team=self.cleaned_data["team"])
+        if self.cleaned_data["correct"] is not None:
+            guesses = guesses.filter(correct=self.cleaned_data["correct"])
+        return guesses
+
+
 class TeamForm(forms.ModelForm):
     class Meta:
         model = Team
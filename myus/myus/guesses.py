@@ -0,0 +1,110 @@
+from .metrics import record_guess
+from .models import ExtraGuessGrant, Guess, normalize_answer
+
+
+class GuessState:
+    """A team's guessing state on a puzzle
+
+    Everything is computed from the team's guesses on the puzzle, which load()
+    and aload() fetch in a single query; the team's extra guess grant is only
+    loaded if the hunt limits guesses.
+    """
+
+    def __init__(self, hunt, team, guesses, extra_guesses=0):
+        self.guesses = guesses
+        self.solved = any(guess.correct for guess in guesses)
+        self.guessed = {guess.guess for guess in guesses}
+
+        guess_limit = hunt.guess_limit
+        self.guesses_limited = bool(guess_limit) if team else None
+
+        if self.guesses_limited:
+            self.guesses_remaining = (
+                guess_limit
+                + extra_guesses
+                - sum(guess.counts_as_guess for guess in guesses)
+            )
+            self.guesses_at_limit = self.guesses_remaining <= 0
+        else:
+            # hunt doesn't limit guesses, or there's no team to guess
+            self.guesses_remaining = 0
+            self.guesses_at_limit = False
+
+    @classmethod
+    def load(cls, hunt_context, puzzle):
+        hunt = hunt_context.hunt
+        team = hunt_context.team
+        if not team:
+            return cls(hunt, team, [])
+
+        guesses = list(Guess.objects.filter(team=team, puzzle=puzzle).order_by("time"))
+        extra_guesses = 0
+        if hunt.guess_limit:
+            extra_guesses = hunt_context.guess_grants.get(puzzle.id, 0)
+        return cls(hunt, team, guesses, extra_guesses)
+
+    @classmethod
+    async def aload(cls, hunt_context, puzzle):
+        hunt = hunt_context.hunt
+        team = await hunt_context.ateam()
+        if not team:
+            return cls(hunt, team, [])
+
+        guesses = [
+            guess
+            async for guess in Guess.objects.filter(team=team, puzzle=puzzle).order_by(
+                "time"
+            )
+        ]
+        extra_guesses = 0
+        if hunt.guess_limit:
+            grant = await ExtraGuessGrant.objects.filter(
+                team=team, puzzle=puzzle
+            ).afirst()
+            if grant:
+                extra_guesses = grant.extra_guesses
+        return cls(hunt, team, guesses, extra_guesses)
+
+    def error_for(self, guess_text):
+        "Why the team can't submit this (normalized) guess, if it can't"
+        if self.solved:
+            return "You have already solved the puzzle!"
+        if self.guesses_at_limit:
+            return "You have no more guesses left!"
+        if guess_text in self.guessed:
+            return "You have already guessed that answer!"
+        return None
+
+
+def _matching_responses(puzzle, guess_text):
+    # if several responses normalize to the same guess, the newest wins
+    return puzzle.guess_responses.filter(normalized_guess=guess_text).order_by("-pk")
+
+
+def _new_guess(team, user, puzzle, guess_text, guess_response):
+    return Guess(
+        guess=guess_text,
+        team=team,
+        user=user,
+        puzzle=puzzle,
+        response=guess_response.response if guess_response else "",
+        counts_as_guess=guess_response is None,
+        correct=(guess_text == normalize_answer(puzzle.answer)),
+    )
+
+
+def submit_guess(team, user, puzzle, guess_text):
+    """Record a team's (normalized) guess on a puzzle, with any special response"""
+    guess_response = _matching_responses(puzzle, guess_text).first()
+    guess = _new_guess(team, user, puzzle, guess_text, guess_response)
+    guess.save()
+    record_guess(guess)
+    return guess
+
+
+async def asubmit_guess(team, user, puzzle, guess_text):
+    guess_response = await _matching_responses(puzzle, guess_text).afirst()
+    guess = _new_guess(team, user, puzzle, guess_text, guess_response)
+    await guess.asave()
+    record_guess(guess)
+    return guess
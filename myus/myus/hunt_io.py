@@ -0,0 +1,155 @@
+"""Hunts as JSON documents, for setting up hunts in bulk
+
+export_hunt() describes a hunt's settings, puzzles and guess responses, and
+import_hunt() creates or updates a hunt from such a description in a single
+transaction, with a fixed number of queries however many puzzles it has.
+Organizers, teams and guesses are not part of the description.
+"""
+
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.forms.models import model_to_dict
+from django.utils import timezone
+
+from .models import GuessResponse, Hunt, Puzzle, normalize_answer
+
+FORMAT_VERSION = 1
+
+HUNT_FIELDS = [
+    "name",
+    "slug",
+    "description",
+    "start_time",
+    "end_time",
+    "progress_floor",
+    "member_limit",
+    "guess_limit",
+    "leaderboard_style",
+    "solution_style",
+]
+PUZZLE_FIELDS = [
+    "name",
+    "slug",
+    "content",
+    "solution_url",
+    "answer",
+    "answer_response",
+    "points",
+    "order",
+    "progress_points",
+    "progress_threshold",
+]
+RESPONSE_FIELDS = ["guess", "response"]
+
+BATCH_SIZE = 500
+
+
+def export_hunt(hunt):
+    """Describe a hunt as a JSON-serializable dict (dates need DjangoJSONEncoder)"""
+    puzzles = hunt.puzzles.order_by("order", "name").prefetch_related("guess_responses")
+    return {
+        "version": FORMAT_VERSION,
+        "hunt": model_to_dict(hunt, HUNT_FIELDS),
+        "puzzles": [
+            {
+                **model_to_dict(puzzle, PUZZLE_FIELDS),
+                "responses": [
+                    model_to_dict(response, RESPONSE_FIELDS)
+                    for response in puzzle.guess_responses.all()
+                ],
+            }
+            for puzzle in puzzles
+        ],
+    }
+
+
+def _assign(obj, data, fields, label):
+    unknown = set(data) - set(fields)
+    if unknown:
+        raise ValidationError(f"{label}: unknown fields {', '.join(sorted(unknown))}")
+    for field in fields:
+        if field in data:
+            setattr(obj, field, data[field])
+
+
+def _clean(obj, label, exclude=None):
+    try:
+        obj.full_clean(
+            exclude=exclude, validate_unique=False, validate_constraints=False
+        )
+    except ValidationError as e:
+        raise ValidationError(f"{label}: {e.message_dict}")
+
+
+def import_hunt(data, hunt=None):
+    """Create a hunt from a description, or update the given hunt from one
+
+    Puzzles are matched to the hunt's existing puzzles by slug. Matched puzzles
+    are updated and their guess responses are replaced with the imported ones;
+    puzzles that aren't in the description are left alone. Raises
+    ValidationError, having changed nothing, if the description is invalid.
+    """
+    if data.get("version") != FORMAT_VERSION:
+        raise ValidationError(f"Unsupported hunt format version {data.get('version')}")
+
+    with transaction.atomic():
+        if hunt is None:
+            hunt = Hunt()
+        _assign(hunt, data.get("hunt", {}), HUNT_FIELDS, "Hunt")
+        _clean(hunt, "Hunt")
+        adding = hunt._state.adding
+        hunt.save()
+
+        existing = {}
+        if not adding:
+            existing = {puzzle.slug: puzzle for puzzle in hunt.puzzles.all()}
+        new_puzzles, updated_puzzles, responses = [], [], []
+        slugs = set()
+        now = timezone.now()
+        for puzzle_data in data.get("puzzles", []):
+            puzzle_data = dict(puzzle_data)
+            response_data = puzzle_data.pop("responses", [])
+            slug = puzzle_data.get("slug")
+            label = f"Puzzle {slug}"
+            if slug in slugs:
+                raise ValidationError(f"{label}: duplicate slug")
+            slugs.add(slug)
+
+            puzzle = existing.get(slug) or Puzzle(hunt=hunt)
+            _assign(puzzle, puzzle_data, PUZZLE_FIELDS, label)
+            # (validating the hunt would take a query per puzzle)
+            _clean(puzzle, label, exclude=["hunt"])
+            if puzzle.pk is None:
+                new_puzzles.append(puzzle)
+            else:
+                # bulk_update doesn't apply auto_now
+                puzzle.updated_at = now
+                updated_puzzles.append(puzzle)
+
+            guesses = set()
+            for fields in response_data:
+                response = GuessResponse(puzzle=puzzle)
+                _assign(response, fields, RESPONSE_FIELDS, label)
+                _clean(response, label, exclude=["puzzle", "normalized_guess"])
+                if response.guess in guesses:
+                    raise ValidationError(
+                        f"{label}: duplicate response to {response.guess}"
+                    )
+                guesses.add(response.guess)
+                # bulk_create doesn't call save(), which normally sets this
+                response.normalized_guess = normalize_answer(response.guess)
+                responses.append(response)
+
+        Puzzle.objects.bulk_create(new_puzzles, batch_size=BATCH_SIZE)
+        if updated_puzzles:
+            Puzzle.objects.bulk_update(
+                updated_puzzles, PUZZLE_FIELDS + ["updated_at"], batch_size=BATCH_SIZE
+            )
+            GuessResponse.objects.filter(puzzle__in=updated_puzzles).delete()
+        GuessResponse.objects.bulk_create(responses, batch_size=BATCH_SIZE)
+
+        # bulk_update skips Puzzle.save(), which keeps solvers' points in sync
+        if updated_puzzles:
+            hunt.teams.rebuild_stats()
+
+    return hunt
@@ -0,0 +1,73 @@
+"""Measuring requests, shared by the metrics and profiling middleware
+
+A single execute wrapper, installed on every database connection, times each
+SQL query once and passes (seconds, sql) to the recorders watching the request
+being handled; see recording_queries(). Queries made in threads on behalf of
+an async view are seen too, as contextvars follow them.
+"""
+
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.db import connections
+from django.db.backends.signals import connection_created
+
+_query_recorders = ContextVar("query_recorders", default=())
+
+
+def _time_query(execute, sql, params, many, context):
+    recorders = _query_recorders.get()
+    if not recorders:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        seconds = time.perf_counter() - start
+        for record in recorders:
+            record(seconds, sql)
+
+
+def _install(connection):
+    if _time_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_time_query)
+
+
+def _install_on_new_connection(sender, connection, **kwargs):
+    _install(connection)
+
+
+connection_created.connect(_install_on_new_connection)
+
+
+@contextmanager
+def recording_queries(record):
+    """Call record(seconds, sql) for each query made inside the block"""
+    # connections opened before this module was loaded didn't get the wrapper
+    # when they were created
+    for connection in connections.all(initialized_only=True):
+        _install(connection)
+    token = _query_recorders.set((*_query_recorders.get(), record))
+    try:
+        yield
+    finally:
+        _query_recorders.reset(token)
+
+
+class HybridMiddleware:
+    """Base for middleware that works in both sync and async stacks
+
+    Subclasses implement __call__ for sync requests, handing off to __acall__
+    when self.is_async.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
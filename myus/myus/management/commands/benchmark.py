@@ -0,0 +1,83 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from myus import benchmarks
+
+
+class Command(BaseCommand):
+    help = (
+        "Time answer normalization, the markdown and duration filters and the "
+        "leaderboard query, optionally saving or comparing against a baseline"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--filter", help="Only run the benchmarks whose names contain this"
+        )
+        parser.add_argument(
+            "--save", metavar="FILE", help="Save the results as a baseline"
+        )
+        parser.add_argument(
+            "--compare",
+            metavar="FILE",
+            help="Compare the results with a saved baseline, failing on regressions",
+        )
+        parser.add_argument(
+            "--threshold",
+            type=float,
+            default=0.2,
+            help="Slowdown that counts as a regression (default: 0.2, for 20%%)",
+        )
+        parser.add_argument(
+            "--min-time",
+            type=float,
+            default=0.2,
+            help="Seconds each timing round lasts at least",
+        )
+        parser.add_argument(
+            "--repeat", type=int, default=5, help="Timing rounds per benchmark"
+        )
+
+    def handle(self, *args, **options):
+        baseline = {}
+        if options["compare"]:
+            try:
+                with open(options["compare"]) as f:
+                    baseline = json.load(f)["results"]
+            except (OSError, ValueError, KeyError) as e:
+                raise CommandError(f"Can't read baseline {options['compare']}: {e}")
+
+        results = benchmarks.run(
+            options["filter"], options["min_time"], options["repeat"]
+        )
+        rows = benchmarks.compare(results, baseline, options["threshold"])
+
+        self.stdout.write(f"{'benchmark':<28} {'time':>10} {'baseline':>10} change")
+        for name, seconds, before, change, regression in rows:
+            line = f"{name:<28} {format_time(seconds):>10}"
+            if before is not None:
+                line += f" {format_time(before):>10} {change:+.1%}"
+                if regression:
+                    line = self.style.ERROR(line + " REGRESSION")
+            self.stdout.write(line)
+
+        if options["save"]:
+            with open(options["save"], "w") as f:
+                json.dump(
+                    {"environment": benchmarks.environment(), "results": results},
+                    f,
+                    indent=2,
+                )
+            self.stdout.write(self.style.SUCCESS(f"Saved to {options['save']}"))
+
+        regressions = [row[0] for row in rows if row[4]]
+        if regressions:
+            raise CommandError(f"Regressions in {', '.join(regressions)}")
+
+
+def format_time(seconds):
+    for unit, scale in [("s", 1), ("ms", 1e-3), ("µs", 1e-6)]:
+        if seconds >= scale:
+            return f"{seconds / scale:.2f} {unit}"
+    return f"{seconds / 1e-9:.0f} ns"
@@ -0,0 +1,26 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+from django.core.serializers.json import DjangoJSONEncoder
+
+from myus.hunt_io import export_hunt
+from myus.models import Hunt
+
+
+class Command(BaseCommand):
+    help = (
+        "Write a hunt's settings, puzzles and guess responses as JSON, for import_hunt"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("hunt", type=int, help="ID of the hunt to export")
+
+    def handle(self, *args, **options):
+        try:
+            hunt = Hunt.objects.get(pk=options["hunt"])
+        except Hunt.DoesNotExist:
+            raise CommandError(f"Hunt {options['hunt']} does not exist")
+
+        self.stdout.write(
+            json.dumps(export_hunt(hunt), cls=DjangoJSONEncoder, indent=2)
+        )
@@ -0,0 +1,57 @@
+import json
+import sys
+
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+
+from myus.hunt_io import import_hunt
+from myus.models import Hunt, User
+
+
+class Command(BaseCommand):
+    help = "Create a hunt, or update an existing one, from JSON written by export_hunt"
+
+    def add_arguments(self, parser):
+        parser.add_argument("file", help="JSON file to import, or - for stdin")
+        parser.add_argument(
+            "--hunt",
+            type=int,
+            help="Update the hunt with this ID instead of creating a new one",
+        )
+        parser.add_argument(
+            "--organizer",
+            action="append",
+            default=[],
+            help="Username to make an organizer of the hunt (may be repeated)",
+        )
+
+    def handle(self, *args, **options):
+        if options["file"] == "-":
+            data = json.load(sys.stdin)
+        else:
+            with open(options["file"]) as f:
+                data = json.load(f)
+
+        hunt = None
+        if options["hunt"] is not None:
+            try:
+                hunt = Hunt.objects.get(pk=options["hunt"])
+            except Hunt.DoesNotExist:
+                raise CommandError(f"Hunt {options['hunt']} does not exist")
+
+        organizers = list(User.objects.filter(username__in=options["organizer"]))
+        missing = set(options["organizer"]) - {user.username for user in organizers}
+        if missing:
+            raise CommandError(f"No such user(s): {', '.join(sorted(missing))}")
+
+        try:
+            hunt = import_hunt(data, hunt)
+        except ValidationError as e:
+            raise CommandError("; ".join(e.messages))
+        hunt.organizers.add(*organizers)
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Imported hunt {hunt.id} ({hunt.name}) with {len(data.get('puzzles', []))} puzzle(s)"
+            )
+        )
@@ -0,0 +1,368 @@
+"""Simulate the opening of a hunt against a running server
+
+The command sets up a throwaway hunt directly in the database the server uses,
+then drives the server over HTTP with a number of virtual teams: each one
+registers a user, logs in and creates a team, and then keeps refreshing the
+hunt page, opening puzzles, submitting guesses and polling the leaderboard
+until the run is over. It reports the latency percentiles and throughput of
+each kind of request, so runs before and after a change can be compared.
+
+Only the standard library is used on the client side. The requests of each
+team run in a thread pool, driven by an asyncio event loop.
+"""
+
+import asyncio
+import json
+import random
+import statistics
+import time
+import uuid
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from http.cookiejar import CookieJar
+from urllib.error import HTTPError, URLError
+from urllib.parse import urlencode
+from urllib.request import (
+    HTTPCookieProcessor,
+    HTTPRedirectHandler,
+    Request,
+    build_opener,
+)
+
+from django.core.management.base import BaseCommand, CommandError
+from django.urls import reverse
+
+from myus.models import Hunt, Puzzle, User
+
+# how often each team does each action, relatively
+ACTION_WEIGHTS = {
+    "view_hunt": 4,
+    "view_puzzle": 3,
+    "guess": 2,
+    "leaderboard": 2,
+}
+SETUP_ACTIONS = ["register", "login", "create_team"]
+
+PASSWORD = "load-test-password"
+
+
+class NoRedirects(HTTPRedirectHandler):
+    """Hand back redirects as they are, so each request is timed on its own"""
+
+    def redirect_request(self, *args, **kwargs):
+        return None
+
+
+class Client:
+    """A browser-like session: cookies, and the CSRF token in POSTs"""
+
+    def __init__(self, base_url, timeout):
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+        self.cookies = CookieJar()
+        self.opener = build_opener(HTTPCookieProcessor(self.cookies), NoRedirects)
+
+    def csrf_token(self):
+        for cookie in self.cookies:
+            if cookie.name == "csrftoken":
+                return cookie.value
+        return ""
+
+    def request(self, path, data=None):
+        """Make a request and return (status, seconds taken)"""
+        url = self.base_url + path
+        headers = {}
+        if data is not None:
+            data = urlencode({**data, "csrfmiddlewaretoken": self.csrf_token()})
+            data = data.encode()
+            # the CSRF check wants a same-origin Referer over HTTPS
+            headers["Referer"] = url
+        start = time.perf_counter()
+        try:
+            with self.opener.open(
+                Request(url, data=data, headers=headers), timeout=self.timeout
+            ) as response:
+                response.read()
+                status = response.status
+        except HTTPError as e:
+            e.read()
+            status = e.code
+        except (URLError, OSError):
+            status = None
+        return status, time.perf_counter() - start
+
+
+class Results:
+    def __init__(self):
+        self.timings = defaultdict(list)
+        self.statuses = defaultdict(Counter)
+
+    def add(self, action, status, seconds):
+        self.timings[action].append(seconds)
+        self.statuses[action][status] += 1
+
+
+def percentile_summary(timings):
+    """p50/p95/p99 of a list of durations, in milliseconds"""
+    if len(timings) == 1:
+        return {p: timings[0] * 1000 for p in ("p50", "p95", "p99")}
+    cuts = statistics.quantiles(timings, n=100, method="inclusive")
+    return {"p50": cuts[49] * 1000, "p95": cuts[94] * 1000, "p99": cuts[98] * 1000}
+
+
+def summarize(results, elapsed):
+    """Per-action counts, errors, percentiles and throughput of a run
+
+    Statuses of 400 and above count as errors, except 429: a throttled guess
+    is the server working as intended. Failed connections count as errors.
+    """
+    actions = {}
+    for action in SETUP_ACTIONS + list(ACTION_WEIGHTS):
+        timings = results.timings.get(action)
+        if not timings:
+            continue
+        statuses = results.statuses[action]
+        actions[action] = {
+            "count": len(timings),
+            "errors": sum(
+                count
+                for status, count in statuses.items()
+                if status is None or (status >= 400 and status != 429)
+            ),
+            "throttled": statuses[429],
+            **percentile_summary(timings),
+            "per_second": len(timings) / elapsed if elapsed else 0,
+        }
+    total = sum(action["count"] for action in actions.values())
+    return {
+        "elapsed": elapsed,
+        "requests": total,
+        "per_second": total / elapsed if elapsed else 0,
+        "actions": actions,
+    }
+
+
+class VirtualTeam:
+    def __init__(self, number, run, options, results, rng):
+        self.client = Client(options["url"], options["timeout"])
+        self.username = f"{run['prefix']}-{number}"
+        self.run = run
+        self.results = results
+        self.rng = rng
+        self.think = options["think"]
+        self.solve_rate = options["solve_rate"]
+
+    async def request(self, action, path, data=None):
+        loop = asyncio.get_running_loop()
+        status, seconds = await loop.run_in_executor(
+            None, self.client.request, path, data
+        )
+        self.results.add(action, status, seconds)
+        return status
+
+    async def pause(self):
+        if self.think > 0:
+            await asyncio.sleep(self.rng.expovariate(1 / self.think))
+
+    async def sign_up(self):
+        """Register, log in and create a team; returns whether it all worked"""
+        await self.request("register", self.run["register"])
+        status = await self.request(
+            "register",
+            self.run["register"],
+            {
+                "username": self.username,
+                "password1": PASSWORD,
+                "password2": PASSWORD,
+                "display_name": self.username,
+            },
+        )
+        if status != 302:
+            return False
+
+        await self.request("login", self.run["login"])
+        status = await self.request(
+            "login",
+            self.run["login"],
+            {"username": self.username, "password": PASSWORD},
+        )
+        if status != 302:
+            return False
+
+        await self.request("create_team", self.run["my_team"])
+        status = await self.request(
+            "create_team",
+            self.run["my_team"],
+            {"create_team": "", "name": f"Team {self.username}"},
+        )
+        return status == 302
+
+    async def play(self, deadline):
+        actions = list(ACTION_WEIGHTS)
+        weights = list(ACTION_WEIGHTS.values())
+        while time.monotonic() < deadline:
+            action = self.rng.choices(actions, weights)[0]
+            if action in ("view_hunt", "leaderboard"):
+                await self.request(action, self.run[action])
+            else:
+                path, answer = self.rng.choice(self.run["puzzles"])
+                if action == "view_puzzle":
+                    await self.request(action, path)
+                else:
+                    if self.rng.random() >= self.solve_rate:
+                        answer = f"WRONG{self.rng.randrange(1000)}"
+                    await self.request(action, path, {"guess": answer})
+            await self.pause()
+
+    async def __call__(self, deadline):
+        if await self.sign_up():
+            await self.play(deadline)
+
+
+class Command(BaseCommand):
+    help = (
+        "Simulate a hunt opening against a running server (e.g. `manage.py "
+        "runserver` on the same database) and report latency percentiles"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--url",
+            default="http://127.0.0.1:8000",
+            help="Base URL of the server under test",
+        )
+        parser.add_argument(
+            "--teams", type=int, default=20, help="Number of simulated teams"
+        )
+        parser.add_argument(
+            "--duration",
+            type=float,
+            default=30,
+            help="Seconds the run lasts, signing up included",
+        )
+        parser.add_argument(
+            "--puzzles", type=int, default=10, help="Number of puzzles in the hunt"
+        )
+        parser.add_argument(
+            "--think",
+            type=float,
+            default=1,
+            help="Mean seconds a team waits between requests (0 for none)",
+        )
+        parser.add_argument(
+            "--solve-rate",
+            type=float,
+            default=0.2,
+            help="Chance that a guess is the right answer",
+        )
+        parser.add_argument(
+            "--timeout", type=float, default=30, help="Seconds before a request fails"
+        )
+        parser.add_argument(
+            "--seed", type=int, default=0, help="Seed of the simulated behavior"
+        )
+        parser.add_argument(
+            "--json", action="store_true", help="Print the report as JSON"
+        )
+        parser.add_argument(
+            "--keep",
+            action="store_true",
+            help="Keep the hunt and users created for the run",
+        )
+
+    def handle(self, *args, **options):
+        if options["teams"] < 1:
+            raise CommandError("--teams must be at least 1")
+
+        run = self.set_up(options)
+        try:
+            summary = asyncio.run(self.drive(run, options))
+        finally:
+            if not options["keep"]:
+                self.tear_down(run)
+
+        if options["json"]:
+            self.stdout.write(json.dumps(summary, indent=2))
+        else:
+            self.report(summary)
+
+    def set_up(self, options):
+        prefix = f"loadtest-{uuid.uuid4().hex[:8]}"
+        hunt = Hunt.objects.create(name=f"Load test {prefix}", slug=prefix)
+        puzzles = [
+            Puzzle(
+                hunt=hunt,
+                name=f"Puzzle {i}",
+                slug=f"puzzle-{i}",
+                answer=f"ANSWER{i}",
+                order=i,
+            )
+            for i in range(1, options["puzzles"] + 1)
+        ]
+        Puzzle.objects.bulk_create(puzzles)
+
+        hunt_args = [hunt.id, hunt.slug]
+        return {
+            "prefix": prefix,
+            "hunt": hunt,
+            "register": reverse("register"),
+            "login": reverse("login"),
+            "my_team": reverse("my_team", args=hunt_args),
+            "view_hunt": reverse("view_hunt", args=hunt_args),
+            "leaderboard": reverse("leaderboard", args=hunt_args),
+            "puzzles": [
+                (
+                    reverse(
+                        "view_puzzle",
+                        args=[hunt.id, hunt.slug, puzzle.id, puzzle.slug],
+                    ),
+                    puzzle.answer,
+                )
+                for puzzle in hunt.puzzles.order_by("order")
+            ],
+        }
+
+    def tear_down(self, run):
+        # teams and guesses go with the hunt
+        run["hunt"].delete()
+        User.objects.filter(username__startswith=run["prefix"] + "-").delete()
+
+    async def drive(self, run, options):
+        results = Results()
+        teams = [
+            VirtualTeam(
+                number,
+                run,
+                options,
+                results,
+                random.Random(f"{options['seed']}-{number}"),
+            )
+            for number in range(options["teams"])
+        ]
+        loop = asyncio.get_running_loop()
+        with ThreadPoolExecutor(max_workers=options["teams"]) as executor:
+            loop.set_default_executor(executor)
+            start = time.monotonic()
+            deadline = start + options["duration"]
+            # everyone signs up at once, like at the opening of a hunt
+            await asyncio.gather(*(team(deadline) for team in teams))
+            elapsed = time.monotonic() - start
+        return summarize(results, elapsed)
+
+    def report(self, summary):
+        self.stdout.write(
+            f"{'action':<12} {'count':>7} {'errors':>7} {'429s':>6} "
+            f"{'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'req/s':>7}"
+        )
+        for action, row in summary["actions"].items():
+            self.stdout.write(
+                f"{action:<12} {row['count']:>7} {row['errors']:>7} "
+                f"{row['throttled']:>6} {row['p50']:>8.1f} {row['p95']:>8.1f} "
+                f"{row['p99']:>8.1f} {row['per_second']:>7.1f}"
+            )
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"{summary['requests']} requests in {summary['elapsed']:.1f}s "
+                f"({summary['per_second']:.1f} requests/s)"
+            )
+        )
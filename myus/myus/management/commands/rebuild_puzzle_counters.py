@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+
+from myus.models import Puzzle
+
+
+class Command(BaseCommand):
+    help = "Recompute the stored solve and guess counters of puzzles from their guesses"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--hunt",
+            type=int,
+            help="Only rebuild the puzzles of the hunt with this ID",
+        )
+
+    def handle(self, *args, **options):
+        puzzles = Puzzle.objects.all()
+        if options["hunt"] is not None:
+            puzzles = puzzles.filter(hunt_id=options["hunt"])
+
+        count = puzzles.rebuild_counters()
+
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt counters for {count} puzzle(s)"))
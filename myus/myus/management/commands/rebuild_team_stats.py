@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from myus.models import Team
+
+
+class Command(BaseCommand):
+    help = "Recompute the stored progress points and leaderboard standings of teams from their guesses"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--hunt",
+            type=int,
+            help="Only rebuild the teams of the hunt with this ID",
+        )
+
+    def handle(self, *args, **options):
+        teams = Team.objects.all()
+        if options["hunt"] is not None:
+            teams = teams.filter(hunt_id=options["hunt"])
+
+        with transaction.atomic():
+            count = teams.rebuild_stats()
+
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt stats for {count} team(s)"))
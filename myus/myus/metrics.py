@@ -0,0 +1,230 @@
+"""Prometheus metrics, served to staff and scrapers at /metrics
+
+MetricsMiddleware records the latency, status and database queries of every
+request by URL name, guess submissions are counted per hunt, and MeteredCache
+counts cache hits and misses by the kind of key. The number of teams that
+guessed recently in each hunt is counted from the database when the metrics
+are scraped.
+
+Under gunicorn, gunicorn.conf.py sets PROMETHEUS_MULTIPROC_DIR so that each
+worker writes its metrics to files there and every scrape adds up all the
+workers; it clears the directory on startup and cleans up after exited workers.
+Other processes keep their metrics in memory.
+https://prometheus.github.io/client_python/multiprocess/
+"""
+
+import os
+import re
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+from django.db.models import Count
+from django.utils import timezone
+from django.utils.module_loading import import_string
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Histogram,
+    generate_latest,
+)
+from prometheus_client.core import GaugeMetricFamily
+from prometheus_client.multiprocess import MultiProcessCollector
+
+from .instrumentation import HybridMiddleware, recording_queries
+from .models import Guess
+
+REQUEST_DURATION = Histogram(
+    "myus_request_duration_seconds",
+    "Time taken to respond to requests, by URL name",
+    ["view"],
+    buckets=[0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10],
+)
+RESPONSES = Counter(
+    "myus_responses_total",
+    "Responses by URL name and status class",
+    ["view", "status"],
+)
+REQUEST_QUERIES = Histogram(
+    "myus_request_queries",
+    "Database queries made per request, by URL name",
+    ["view"],
+    buckets=[0, 1, 2, 5, 10, 20, 50, 100, 200],
+)
+REQUEST_DB_DURATION = Histogram(
+    "myus_request_db_duration_seconds",
+    "Time spent in database queries per request, by URL name",
+    ["view"],
+    buckets=[0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5],
+)
+GUESSES = Counter(
+    "myus_guesses_total",
+    "Guesses submitted, by hunt and whether they were correct",
+    ["hunt", "correct"],
+)
+CACHE_REQUESTS = Counter(
+    "myus_cache_requests_total",
+    "Cache lookups by kind of key and result (hit or miss)",
+    ["kind", "result"],
+)
+
+UNRESOLVED_VIEW = "<unresolved>"
+
+
+def record_guess(guess):
+    GUESSES.labels(
+        hunt=str(guess.puzzle.hunt_id), correct=str(guess.correct).lower()
+    ).inc()
+
+
+class QueryTotals:
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+
+    def record_query(self, seconds, sql):
+        self.count += 1
+        self.seconds += seconds
+
+
+class MetricsMiddleware(HybridMiddleware):
+    """Record the latency, status and queries of every request
+
+    Should come first, so that the time of the other middleware is included.
+    """
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+
+        start, queries = time.perf_counter(), QueryTotals()
+        with recording_queries(queries.record_query):
+            response = self.get_response(request)
+        self._record(request, response, start, queries)
+        return response
+
+    async def __acall__(self, request):
+        start, queries = time.perf_counter(), QueryTotals()
+        with recording_queries(queries.record_query):
+            response = await self.get_response(request)
+        self._record(request, response, start, queries)
+        return response
+
+    def _record(self, request, response, start, queries):
+        match = request.resolver_match
+        view = match.view_name if match else UNRESOLVED_VIEW
+        REQUEST_DURATION.labels(view).observe(time.perf_counter() - start)
+        RESPONSES.labels(view, f"{response.status_code // 100}xx").inc()
+        REQUEST_QUERIES.labels(view).observe(queries.count)
+        REQUEST_DB_DURATION.labels(view).observe(queries.seconds)
+
+
+_MISSING = object()
+
+
+def _key_kind(key):
+    # template fragments are cached as template.cache.<fragment name>.<hash>
+    if key.startswith("template.cache."):
+        return key.split(".")[2]
+    return re.split(r"[:.]", key, maxsplit=1)[0][:32]
+
+
+class MeteredCache(BaseCache):
+    """A cache backend that counts the hits and misses of another one
+
+    The backend to wrap is given as the BACKEND in OPTIONS; everything else is
+    passed on to it.
+    """
+
+    def __init__(self, location, params):
+        options = dict(params.get("OPTIONS", {}))
+        backend = options.pop("BACKEND")
+        params = {**params, "OPTIONS": options}
+        super().__init__(params)
+        self.cache = import_string(backend)(location, params)
+
+    def _count(self, key, hit):
+        CACHE_REQUESTS.labels(_key_kind(key), "hit" if hit else "miss").inc()
+
+    def get(self, key, default=None, version=None):
+        value = self.cache.get(key, _MISSING, version=version)
+        self._count(key, value is not _MISSING)
+        return default if value is _MISSING else value
+
+    def get_many(self, keys, version=None):
+        keys = list(keys)
+        values = self.cache.get_many(keys, version=version)
+        for key in keys:
+            self._count(key, key in values)
+        return values
+
+    def has_key(self, key, version=None):
+        return self.cache.has_key(key, version=version)
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        return self.cache.add(key, value, timeout, version=version)
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        return self.cache.set(key, value, timeout, version=version)
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        return self.cache.set_many(data, timeout, version=version)
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        return self.cache.touch(key, timeout, version=version)
+
+    def delete(self, key, version=None):
+        return self.cache.delete(key, version=version)
+
+    def delete_many(self, keys, version=None):
+        return self.cache.delete_many(keys, version=version)
+
+    def incr(self, key, delta=1, version=None):
+        return self.cache.incr(key, delta, version=version)
+
+    def decr(self, key, delta=1, version=None):
+        return self.cache.decr(key, delta, version=version)
+
+    def clear(self):
+        return self.cache.clear()
+
+    def close(self, **kwargs):
+        return self.cache.close(**kwargs)
+
+
+class ActiveTeamsCollector:
+    """The number of teams in each hunt that guessed in the last few minutes"""
+
+    def collect(self):
+        since = timezone.now() - timedelta(seconds=settings.METRICS_ACTIVE_TEAM_WINDOW)
+        counts = (
+            Guess.objects.filter(time__gte=since)
+            .values("team__hunt_id")
+            .annotate(teams=Count("team_id", distinct=True))
+            .values_list("team__hunt_id", "teams")
+        )
+        metric = GaugeMetricFamily(
+            "myus_active_teams",
+            f"Teams that guessed in the last {settings.METRICS_ACTIVE_TEAM_WINDOW} seconds, by hunt",
+            labels=["hunt"],
+        )
+        for hunt_id, teams in counts:
+            metric.add_metric([str(hunt_id)], teams)
+        yield metric
+
+
+def latest_metrics():
+    """All the metrics in the Prometheus text format, with its content type"""
+    if "PROMETHEUS_MULTIPROC_DIR" in os.environ:
+        registry = CollectorRegistry()
+        MultiProcessCollector(registry)
+        process_metrics = generate_latest(registry)
+    else:
+        process_metrics = generate_latest(REGISTRY)
+
+    database_registry = CollectorRegistry()
+    database_registry.register(ActiveTeamsCollector())
+    return process_metrics + generate_latest(database_registry), CONTENT_TYPE_LATEST
@@ -0,0 +1,43 @@
+# Generated by Django 5.1.3 on 2026-10-16 22:37
+
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+
+
+def populate_progress_points(apps, schema_editor):
+    Guess = apps.get_model("myus", "Guess")
+    Team = apps.get_model("myus", "Team")
+    Team.objects.update(
+        progress_points=Coalesce(
+            Subquery(
+                Guess.objects.filter(team=OuterRef("pk"), correct=True)
+                .values("team")
+                .annotate(sum=Sum("puzzle__progress_points"))
+                .values("sum")
+            ),
+            0,
+        )
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        (
+            "myus",
+            "0012_hunt_solution_style_puzzle_solution_url_squashed_0014_alter_puzzle_solution_url",
+        ),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="team",
+            name="progress_points",
+            field=models.IntegerField(
+                default=0,
+                help_text="Total 'progress points' granted by the puzzles this team has solved. This is kept up to date whenever the team solves a puzzle; run the rebuild_team_stats command if it ever drifts.",
+            ),
+        ),
+        migrations.RunPython(populate_progress_points, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,83 @@
+# Generated by Django 5.1.3 on 2026-10-16 22:38
+
+import datetime
+from django.db import migrations, models
+from django.db.models import Count, F, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce, Greatest
+
+
+def populate_standings(apps, schema_editor):
+    Guess = apps.get_model("myus", "Guess")
+    Hunt = apps.get_model("myus", "Hunt")
+    Team = apps.get_model("myus", "Team")
+    correct_guesses = Guess.objects.filter(team=OuterRef("pk"), correct=True)
+    solve_totals = correct_guesses.values("team").annotate(
+        score=Sum("puzzle__points"), solve_count=Count("pk")
+    )
+    Team.objects.update(
+        score=Coalesce(Subquery(solve_totals.values("score")), 0),
+        solve_count=Coalesce(Subquery(solve_totals.values("solve_count")), 0),
+        last_solve=Subquery(correct_guesses.order_by("-time").values("time")[:1]),
+    )
+    created_or_start = Greatest(
+        F("creation_time"),
+        Coalesce(
+            Subquery(Hunt.objects.filter(pk=OuterRef("hunt")).values("start_time")),
+            F("creation_time"),
+        ),
+    )
+    Team.objects.update(
+        solve_time=Greatest(
+            Coalesce(F("last_solve"), created_or_start) - created_or_start,
+            datetime.timedelta(seconds=0),
+            output_field=models.DurationField(),
+        )
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("myus", "0015_team_progress_points"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="team",
+            name="last_solve",
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="team",
+            name="score",
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="team",
+            name="solve_count",
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="team",
+            name="solve_time",
+            field=models.DurationField(
+                default=datetime.timedelta(0),
+                help_text="Time from the later of team creation and hunt start until the team's last solve.",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="team",
+            index=models.Index(
+                fields=["hunt", "-score", "-solve_count", "last_solve"],
+                name="team_leaderboard_default",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="team",
+            index=models.Index(
+                fields=["hunt", "-score", "solve_time", "last_solve"],
+                name="team_leaderboard_speedrun",
+            ),
+        ),
+        migrations.RunPython(populate_standings, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 5.1.3 on 2026-10-16 22:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("myus", "0016_team_leaderboard_standings"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="guess",
+            index=models.Index(
+                fields=["team", "puzzle", "time"], name="guess_team_puzzle_time"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="guess",
+            index=models.Index(fields=["puzzle", "time"], name="guess_puzzle_time"),
+        ),
+        migrations.AddIndex(
+            model_name="guess",
+            index=models.Index(
+                fields=["team", "puzzle", "guess"], name="guess_team_puzzle_guess"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="guess",
+            index=models.Index(
+                condition=models.Q(("correct", True)),
+                fields=["team", "time"],
+                name="guess_team_correct_time",
+            ),
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 5.1.3 on 2026-10-16 22:45
+
+from django.db import migrations, models
+
+
+def populate_normalized_guess(apps, schema_editor):
+    GuessResponse = apps.get_model("myus", "GuessResponse")
+    guess_responses = list(GuessResponse.objects.all())
+    for guess_response in guess_responses:
+        guess_response.normalized_guess = "".join(
+            c for c in guess_response.guess if c.isalnum()
+        ).upper()
+    GuessResponse.objects.bulk_update(
+        guess_responses, ["normalized_guess"], batch_size=1000
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("myus", "0017_guess_indexes"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="guessresponse",
+            name="normalized_guess",
+            field=models.CharField(default="", editable=False, max_length=500),
+            preserve_default=False,
+        ),
+        migrations.RunPython(populate_normalized_guess, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name="guessresponse",
+            index=models.Index(
+                fields=["puzzle", "normalized_guess"], name="guessresponse_normalized"
+            ),
+        ),
+    ]
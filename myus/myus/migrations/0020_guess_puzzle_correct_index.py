@@ -0,0 +1,21 @@
+# Generated by Django 5.1.3 on 2026-10-17 00:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("myus", "0019_updated_at"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="guess",
+            index=models.Index(
+                condition=models.Q(("correct", True)),
+                fields=["puzzle"],
+                name="guess_puzzle_correct",
+            ),
+        ),
+    ]
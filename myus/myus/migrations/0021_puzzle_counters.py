@@ -0,0 +1,47 @@
+# Generated by Django 5.1.3 on 2026-10-17 00:50
+
+from django.db import migrations, models
+from django.db.models import Count, Max, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def populate_counters(apps, schema_editor):
+    Guess = apps.get_model("myus", "Guess")
+    Puzzle = apps.get_model("myus", "Puzzle")
+    guesses = Guess.objects.filter(puzzle=OuterRef("pk")).order_by().values("puzzle")
+    solves = guesses.filter(correct=True)
+    Puzzle.objects.update(
+        solve_count=Coalesce(
+            Subquery(solves.annotate(count=Count("pk")).values("count")), 0
+        ),
+        guess_count=Coalesce(
+            Subquery(guesses.annotate(count=Count("pk")).values("count")), 0
+        ),
+        last_solve_time=Subquery(solves.annotate(last=Max("time")).values("last")),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("myus", "0020_guess_puzzle_correct_index"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="puzzle",
+            name="guess_count",
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name="puzzle",
+            name="last_solve_time",
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name="puzzle",
+            name="solve_count",
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(populate_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.1.3 on 2026-10-16 23:14
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("myus", "0021_puzzle_counters"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="guess",
+            index=models.Index(fields=["time"], name="guess_time"),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.1.3 on 2026-10-16 23:31
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("myus", "0022_guess_time_index"),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name="guess",
+            name="guess_team_puzzle_guess",
+        ),
+    ]
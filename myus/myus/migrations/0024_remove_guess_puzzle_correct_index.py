@@ -0,0 +1,17 @@
+# Generated by Django 5.1.3 on 2026-10-16 23:42
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("myus", "0023_remove_guess_team_puzzle_guess_index"),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name="guess",
+            name="guess_puzzle_correct",
+        ),
+    ]
@@ -1,16 +1,28 @@
-from django.db import models
+from django.db import models, transaction
+from django.db.models.signals import post_delete, pre_delete
+from django.dispatch import receiver
 
 from django.contrib.auth.models import AbstractUser
 
-from django.db.models import Subquery, OuterRef, Exists, Sum, Q
+from django.db.models import Subquery, OuterRef, Sum, Count, Max, Q, F
+from django.db.models.functions import Coalesce, Greatest
 
 from django.core.validators import MinValueValidator
 
 import django.urls as urls
 
+from datetime import timedelta
+
+from . import events
+from .versions import HUNT_STATS, LEADERBOARD, bump_version
+
 DEFAULT_GUESS_LIMIT = 20
 
 
+def normalize_answer(answer):
+    return "".join(c for c in answer if c.isalnum()).upper()
+
+
 class User(AbstractUser):
     display_name = models.CharField(max_length=500, blank=True, help_text="Optional.")
     discord_username = models.CharField(
@@ -26,6 +38,7 @@ class Hunt(models.Model):
     name = models.CharField(max_length=500)
     description = models.TextField(help_text="Description of the hunt.")
     creation_time = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
     start_time = models.DateTimeField(
         blank=True,
         null=True,
@@ -76,13 +89,55 @@ class Hunt(models.Model):
 
     slug = models.SlugField(help_text="A short, unique identifier for the hunt.")
 
+    def save(self, *args, **kwargs):
+        with transaction.atomic():
+            adding = self._state.adding
+            old_start_time = None
+            if not adding:
+                old_start_time = (
+                    Hunt.objects.filter(pk=self.pk)
+                    .values_list("start_time", flat=True)
+                    .first()
+                )
+            super().save(*args, **kwargs)
+
+            # Solve times are measured from the start of the hunt
+            if not adding and old_start_time != self.start_time:
+                self.teams.rebuild_stats()
+
+            transaction.on_commit(lambda: bump_version(LEADERBOARD, self.pk))
+
     def public_puzzles(self):
         return self.puzzles.filter(progress_threshold__lte=self.progress_floor)
 
+    def leaderboard_teams(self):
+        """The hunt's teams in leaderboard order, by their stored standings"""
+        if self.leaderboard_style == Hunt.LeaderboardStyle.SPEEDRUN:
+            return self.teams.order_by("-score", "solve_time", "last_solve")
+        return self.teams.order_by("-score", "-solve_count", "last_solve")
+
     def __str__(self):
         return self.name
 
 
+class PuzzleQuerySet(models.QuerySet):
+    def rebuild_counters(self):
+        """Recompute the stored solve and guess counters of these puzzles from their guesses"""
+        guesses = (
+            Guess.objects.filter(puzzle=OuterRef("pk")).order_by().values("puzzle")
+        )
+        solves = guesses.filter(correct=True)
+        return self.update(
+            solve_count=Coalesce(
+                Subquery(solves.annotate(count=Count("pk")).values("count")), 0
+            ),
+            guess_count=Coalesce(
+                Subquery(guesses.annotate(count=Count("pk")).values("count")), 0
+            ),
+            last_solve_time=Subquery(solves.annotate(last=Max("time")).values("last")),
+        )
+
+
 class Puzzle(models.Model):
     hunt = models.ForeignKey(Hunt, on_delete=models.CASCADE, related_name="puzzles")
     name = models.CharField(max_length=500)
@@ -124,6 +179,46 @@ class Puzzle(models.Model):
         validators=[MinValueValidator(0)],
     )
     slug = models.SlugField(help_text="A short, unique identifier for the puzzle.")
+    updated_at = models.DateTimeField(auto_now=True)
+    # Counters maintained as guesses come in (rebuild_puzzle_counters recomputes them)
+    solve_count = models.IntegerField(default=0, editable=False)
+    guess_count = models.IntegerField(default=0, editable=False)
+    last_solve_time = models.DateTimeField(blank=True, null=True, editable=False)
+
+    objects = PuzzleQuerySet.as_manager()
+
+    def save(self, *args, **kwargs):
+        with transaction.atomic():
+            old_points = None
+            if self.pk is not None:
+                old_points = (
+                    Puzzle.objects.filter(pk=self.pk)
+                    .values_list("points", "progress_points")
+                    .first()
+                )
+            super().save(*args, **kwargs)
+
+            # Teams that already solved this puzzle keep the points they earned
+            # in sync with the puzzle's current values
+            if old_points is not None and old_points != (
+                self.points,
+                self.progress_points,
+            ):
+                self.solved_teams().rebuild_stats()
+
+    def record_guess(self, guess):
+        """Update the stored counters for a newly saved guess"""
+        counters = {"guess_count": F("guess_count") + 1}
+        if guess.correct:
+            counters["solve_count"] = F("solve_count") + 1
+            # solves can commit out of order, so this only ever advances
+            counters["last_solve_time"] = Greatest(
+                Coalesce(F("last_solve_time"), guess.time), guess.time
+            )
+        Puzzle.objects.filter(pk=self.pk).update(**counters)
+
+    def solved_teams(self):
+        return Team.objects.filter(guesses__puzzle=self, guesses__correct=True)
 
     def is_viewable_by(self, team):
         if team:
@@ -151,15 +246,67 @@ class GuessResponse(models.Model):
         Puzzle, on_delete=models.CASCADE, related_name="guess_responses"
     )
     guess = models.CharField(max_length=500)
+    normalized_guess = models.CharField(max_length=500, editable=False)
     response = models.CharField(max_length=500)
 
     class Meta:
         unique_together = ("puzzle", "guess")
+        indexes = [
+            models.Index(
+                name="guessresponse_normalized",
+                fields=["puzzle", "normalized_guess"],
+            ),
+        ]
+
+    def save(self, *args, **kwargs):
+        self.normalized_guess = normalize_answer(self.guess)
+        super().save(*args, **kwargs)
 
     def __str__(self):
         return self.puzzle.name + "_" + self.guess
 
 
+class TeamQuerySet(models.QuerySet):
+    def rebuild_stats(self):
+        """Recompute the stored progress and leaderboard standings of these teams from their guesses"""
+        correct_guesses = Guess.objects.filter(team=OuterRef("pk"), correct=True)
+        solve_totals = correct_guesses.values("team").annotate(
+            score=Sum("puzzle__points"),
+            progress_points=Sum("puzzle__progress_points"),
+            solve_count=Count("pk"),
+        )
+        created_or_start = Greatest(
+            F("creation_time"),
+            Coalesce(
+                Subquery(Hunt.objects.filter(pk=OuterRef("hunt")).values("start_time")),
+                F("creation_time"),
+            ),
+        )
+        self.update(
+            progress_points=Coalesce(
+                Subquery(solve_totals.values("progress_points")), 0
+            ),
+            score=Coalesce(Subquery(solve_totals.values("score")), 0),
+            solve_count=Coalesce(Subquery(solve_totals.values("solve_count")), 0),
+            last_solve=Subquery(correct_guesses.order_by("-time").values("time")[:1]),
+        )
+        # solve_time depends on last_solve, so it needs a second pass
+        count = self.update(
+            solve_time=Greatest(
+                Coalesce(F("last_solve"), created_or_start) - created_or_start,
+                timedelta(seconds=0),
+                output_field=models.DurationField(),
+            )
+        )
+
+        for hunt_id in set(self.values_list("hunt_id", flat=True)):
+            transaction.on_commit(
+                lambda hunt_id=hunt_id: bump_version(LEADERBOARD, hunt_id)
+            )
+
+        return count
+
+
 class Team(models.Model):
     # TODO: Should we have a team captain?
     name = models.CharField(max_length=500)
@@ -171,23 +318,74 @@ class Team(models.Model):
         User, blank=True, related_name="invited_teams"
     )
     creation_time = models.DateTimeField(auto_now_add=True)
+    progress_points = models.IntegerField(
+        default=0,
+        help_text="Total 'progress points' granted by the puzzles this team has solved. This is kept up to date whenever the team solves a puzzle; run the rebuild_team_stats command if it ever drifts.",
+    )
+
+    # Leaderboard standings, maintained alongside progress_points
+    score = models.IntegerField(default=0)
+    solve_count = models.IntegerField(default=0)
+    last_solve = models.DateTimeField(blank=True, null=True)
+    solve_time = models.DurationField(
+        default=timedelta(0),
+        help_text="Time from the later of team creation and hunt start until the team's last solve.",
+    )
+
+    objects = TeamQuerySet.as_manager()
+
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        transaction.on_commit(lambda: bump_version(LEADERBOARD, self.hunt_id))
 
     def progress(self):
-        puzzles = self.hunt.puzzles
-        team_progress = (
-            puzzles.annotate(
-                solved=Exists(
-                    Guess.objects.filter(team=self, puzzle=OuterRef("pk"), correct=True)
-                ),
-            )
-            .filter(solved=True)
-            .aggregate(sum=Sum("progress_points"))["sum"]
+        return max(self.progress_points, self.hunt.progress_floor)
+
+    def record_solve(self, guess):
+        """Update the stored progress and standings for a newly saved correct guess"""
+        puzzle = guess.puzzle
+        # solves can commit out of order, so the last solve only ever advances
+        last_solve = Greatest(Coalesce(F("last_solve"), guess.time), guess.time)
+        Team.objects.filter(pk=self.pk).update(
+            progress_points=F("progress_points") + puzzle.progress_points,
+            score=F("score") + puzzle.points,
+            solve_count=F("solve_count") + 1,
+            last_solve=last_solve,
+            solve_time=Greatest(
+                last_solve - self.solve_start_time(),
+                timedelta(seconds=0),
+                output_field=models.DurationField(),
+            ),
+        )
+        # the guess is saved by the time these run, so failures are only logged
+        transaction.on_commit(
+            lambda: bump_version(LEADERBOARD, self.hunt_id), robust=True
+        )
+        transaction.on_commit(lambda: self.publish_solve(guess), robust=True)
+
+    def publish_solve(self, guess):
+        """Tell live listeners about a solve and the team's resulting standing"""
+        standing = Team.objects.values(
+            "id", "name", "score", "solve_count", "last_solve", "solve_time"
+        ).get(pk=self.pk)
+        # a concurrent delete or rebuild may have cleared it since
+        if standing["last_solve"] is not None:
+            standing["last_solve"] = standing["last_solve"].isoformat()
+        standing["solve_time"] = standing["solve_time"].total_seconds()
+        events.publish(
+            self.hunt_id,
+            {
+                "type": "solve",
+                "team": standing,
+                "puzzle": {"id": guess.puzzle_id, "name": guess.puzzle.name},
+            },
         )
-        if team_progress is None:
-            team_progress = 0
-        hunt_progress = self.hunt.progress_floor
 
-        return max(team_progress, hunt_progress)
+    def solve_start_time(self):
+        start_time = self.hunt.start_time
+        if start_time is None or start_time < self.creation_time:
+            return self.creation_time
+        return start_time
 
     def unlocked_puzzles(self):
         return self.hunt.puzzles.filter(progress_threshold__lte=self.progress())
@@ -207,6 +405,16 @@ class Team(models.Model):
                 name="unique_team_name_per_hunt", fields=["name", "hunt"]
             ),
         ]
+        indexes = [
+            models.Index(
+                name="team_leaderboard_default",
+                fields=["hunt", "-score", "-solve_count", "last_solve"],
+            ),
+            models.Index(
+                name="team_leaderboard_speedrun",
+                fields=["hunt", "-score", "solve_time", "last_solve"],
+            ),
+        ]
 
     def __str__(self):
         return self.hunt.name + "_" + self.name
@@ -232,11 +440,92 @@ class Guess(models.Model):
                 condition=Q(correct=True),
             )
         ]
+        indexes = [
+            # a team's guesses on a puzzle, in order (puzzle page, guess counts)
+            models.Index(
+                name="guess_team_puzzle_time", fields=["team", "puzzle", "time"]
+            ),
+            # all guesses on a puzzle, in order (puzzle log; also the rare
+            # rebuilds of a puzzle's counters and solvers)
+            models.Index(name="guess_puzzle_time", fields=["puzzle", "time"]),
+            # a team's solves, in order (progress, standings)
+            models.Index(
+                name="guess_team_correct_time",
+                fields=["team", "time"],
+                condition=Q(correct=True),
+            ),
+            # recent guesses (active teams metric)
+            models.Index(name="guess_time", fields=["time"]),
+        ]
+
+    def save(self, *args, **kwargs):
+        adding = self._state.adding
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            if adding:
+                self.puzzle.record_guess(self)
+            if adding and self.correct:
+                self.team.record_solve(self)
 
     def __str__(self):
         return self.team.name + "_" + self.puzzle.name + "_" + self.guess
 
 
+# Deleted guesses are handled with signals rather than by overriding delete(),
+# so that queryset deletes (as in the admin) and cascades keep the stored
+# counters and standings in sync too. Every guess in a delete gets its
+# pre_delete signal before any of them is deleted, and its post_delete signal
+# after they all are, so the affected teams and puzzles are collected first and
+# rebuilt once, after the last guess's post_delete. Deletes are told apart by
+# the object or queryset they started from.
+_pending_guess_deletes = {}
+
+
+class _PendingGuessDelete:
+    def __init__(self):
+        self.count = 0
+        self.solved_team_ids = set()
+        self.puzzle_ids = set()
+
+
+@receiver(pre_delete, sender="myus.Guess")
+def _collect_deleted_guess(sender, instance, origin=None, **kwargs):
+    pending = _pending_guess_deletes.setdefault(id(origin), _PendingGuessDelete())
+    pending.count += 1
+    pending.puzzle_ids.add(instance.puzzle_id)
+    if instance.correct:
+        pending.solved_team_ids.add(instance.team_id)
+
+
+@receiver(post_delete, sender="myus.Guess")
+def _rebuild_after_guess_delete(sender, instance, origin=None, **kwargs):
+    pending = _pending_guess_deletes.get(id(origin))
+    if pending is None:
+        return
+    pending.count -= 1
+    if pending.count > 0:
+        return
+    del _pending_guess_deletes[id(origin)]
+
+    # teams and puzzles being deleted along with the guesses just aren't found
+    Team.objects.filter(pk__in=pending.solved_team_ids).rebuild_stats()
+    puzzles = Puzzle.objects.filter(pk__in=pending.puzzle_ids)
+    puzzles.rebuild_counters()
+    for hunt_id in set(puzzles.values_list("hunt_id", flat=True)):
+        transaction.on_commit(lambda hunt_id=hunt_id: bump_version(HUNT_STATS, hunt_id))
+
+
+@receiver(post_delete, sender="myus.Puzzle")
+def _bump_after_puzzle_delete(sender, instance, **kwargs):
+    transaction.on_commit(lambda: bump_version(HUNT_STATS, instance.hunt_id))
+
+
+@receiver(post_delete, sender="myus.Team")
+def _bump_after_team_delete(sender, instance, **kwargs):
+    transaction.on_commit(lambda: bump_version(LEADERBOARD, instance.hunt_id))
+    transaction.on_commit(lambda: bump_version(HUNT_STATS, instance.hunt_id))
+
+
 class ExtraGuessGrant(models.Model):
     "Extra guesses granted to a particular team."
 
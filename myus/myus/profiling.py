@@ -0,0 +1,133 @@
+"""Opt-in timing of requests and their SQL queries
+
+ProfilingMiddleware measures how long each view takes, how many queries it
+makes and how long they take, and reports it in a Server-Timing header (shown
+in browsers' developer tools) and in a JSON log line on the myus.profiling
+logger, with the slowest queries. The time measured is until the view returns
+its response, so it doesn't include sending a streamed body.
+
+It's on for every request if PROFILING_ENABLED is set. Otherwise an organizer
+or staff member can profile a single page by adding ?profile=<token> to its
+URL, where the token comes from profile_token() (organizers get one from the
+link on their hunt pages); the report is only given out to staff and to
+organizers of the page's hunt.
+"""
+
+import json
+import logging
+import time
+
+from django.conf import settings
+from django.core import signing
+
+from .instrumentation import HybridMiddleware, recording_queries
+
+logger = logging.getLogger(__name__)
+
+TOKEN_SALT = "myus.profiling"
+QUERY_PARAMETER = "profile"
+
+
+def profile_token(user):
+    """A token that lets the user profile pages for PROFILING_TOKEN_MAX_AGE seconds"""
+    return signing.TimestampSigner(salt=TOKEN_SALT).sign(str(user.pk))
+
+
+def _token_user_id(request):
+    token = request.GET.get(QUERY_PARAMETER)
+    if not token:
+        return None
+    try:
+        return signing.TimestampSigner(salt=TOKEN_SALT).unsign(
+            token, max_age=settings.PROFILING_TOKEN_MAX_AGE
+        )
+    except signing.BadSignature:
+        return None
+
+
+class Profile:
+    def __init__(self):
+        self.queries = []
+        self.start = time.perf_counter()
+
+    def record_query(self, seconds, sql):
+        self.queries.append((seconds, sql))
+
+
+def _may_see_report(user, request):
+    if user.is_staff:
+        return True
+    hunt_context = getattr(request, "hunt_context", None)
+    return hunt_context is not None and hunt_context.is_organizer
+
+
+def _report(request, response, profile):
+    total = time.perf_counter() - profile.start
+    db_time = sum(seconds for seconds, _ in profile.queries)
+    count = len(profile.queries)
+    response["Server-Timing"] = (
+        f"total;dur={total * 1000:.1f}, "
+        f'db;dur={db_time * 1000:.1f};desc="{count} queries"'
+    )
+
+    match = request.resolver_match
+    slowest = sorted(profile.queries, key=lambda query: query[0], reverse=True)
+    logger.info(
+        json.dumps(
+            {
+                "view": match.view_name if match else None,
+                "method": request.method,
+                "path": request.path,
+                "status": response.status_code,
+                "total_ms": round(total * 1000, 1),
+                "db_ms": round(db_time * 1000, 1),
+                "queries": count,
+                "slowest_queries": [
+                    {"ms": round(seconds * 1000, 1), "sql": sql}
+                    for seconds, sql in slowest[: settings.PROFILING_SLOWEST_QUERIES]
+                ],
+            }
+        )
+    )
+
+
+class ProfilingMiddleware(HybridMiddleware):
+    """Report the time taken and queries made by profiled requests
+
+    Has to come after AuthenticationMiddleware.
+    """
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+
+        user_id = _token_user_id(request)
+        if not settings.PROFILING_ENABLED and (
+            user_id is None or str(request.user.pk) != user_id
+        ):
+            return self.get_response(request)
+
+        profile = Profile()
+        with recording_queries(profile.record_query):
+            response = self.get_response(request)
+        if settings.PROFILING_ENABLED or _may_see_report(request.user, request):
+            _report(request, response, profile)
+        return response
+
+    async def __acall__(self, request):
+        user_id = _token_user_id(request)
+        if not settings.PROFILING_ENABLED:
+            if user_id is None:
+                return await self.get_response(request)
+            user = await request.auser()
+            if str(user.pk) != user_id:
+                return await self.get_response(request)
+
+        profile = Profile()
+        with recording_queries(profile.record_query):
+            response = await self.get_response(request)
+        if settings.PROFILING_ENABLED or _may_see_report(
+            await request.auser(), request
+        ):
+            _report(request, response, profile)
+        return response
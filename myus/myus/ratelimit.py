@@ -0,0 +1,127 @@
+"""Rate limiting of guess submissions
+
+Guesses are limited per team and puzzle, and per user, with token buckets:
+a bucket holds up to `burst` tokens, refills at `per_minute` tokens a minute,
+and every guess takes one token. Buckets live in process memory, or in the
+cache named by GUESS_RATE_CACHE_ALIAS so that all server processes share them.
+"""
+
+import math
+import threading
+import time
+from collections import OrderedDict
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+
+
+def _refill(bucket, now, burst, per_minute):
+    tokens, updated = bucket
+    return min(burst, tokens + (now - updated) * per_minute / 60)
+
+
+class LocalBuckets:
+    """Token buckets in process memory
+
+    Only the max_buckets most recently used buckets are kept; a forgotten
+    bucket starts out full again.
+    """
+
+    max_buckets = 10000
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._buckets = OrderedDict()
+
+    def take(self, key, burst, per_minute, now):
+        with self._lock:
+            tokens = _refill(
+                self._buckets.pop(key, (burst, now)), now, burst, per_minute
+            )
+            allowed = tokens >= 1
+            if allowed:
+                tokens -= 1
+
+            self._buckets[key] = (tokens, now)
+            if len(self._buckets) > self.max_buckets:
+                self._buckets.popitem(last=False)
+            return allowed
+
+    def clear(self):
+        with self._lock:
+            self._buckets.clear()
+
+
+class CacheBuckets:
+    """Token buckets in a (shared) cache
+
+    Reading and writing a bucket isn't atomic, so simultaneous guesses in
+    different processes can slightly exceed the limit.
+    """
+
+    def __init__(self, cache):
+        self.cache = cache
+
+    def take(self, key, burst, per_minute, now):
+        tokens = _refill(self.cache.get(key, (burst, now)), now, burst, per_minute)
+        allowed = tokens >= 1
+        if allowed:
+            tokens -= 1
+
+        # by the time the entry expires the bucket would be full again anyway
+        timeout = math.ceil(burst * 60 / per_minute) + 1
+        self.cache.set(key, (tokens, now), timeout)
+        return allowed
+
+
+_local_buckets = LocalBuckets()
+
+
+def _buckets():
+    if settings.GUESS_RATE_CACHE_ALIAS:
+        return CacheBuckets(caches[settings.GUESS_RATE_CACHE_ALIAS])
+    return _local_buckets
+
+
+def allow_guess(user_id, team_id, puzzle_id):
+    """Take a token for a guess from the user's and the team's buckets
+
+    Returns False if either bucket is empty, in which case the guess should be
+    rejected. A limit of 0 per minute disables that bucket.
+    """
+    buckets = _buckets()
+    now = time.time()
+    limits = [
+        (
+            f"guess-rate:user:{user_id}",
+            settings.GUESS_RATE_USER_BURST,
+            settings.GUESS_RATE_USER_PER_MINUTE,
+        ),
+        (
+            f"guess-rate:team:{team_id}:{puzzle_id}",
+            settings.GUESS_RATE_TEAM_BURST,
+            settings.GUESS_RATE_TEAM_PER_MINUTE,
+        ),
+    ]
+    return all(
+        buckets.take(key, burst, per_minute, now)
+        for key, burst, per_minute in limits
+        if per_minute
+    )
+
+
+async def aallow_guess(user_id, team_id, puzzle_id):
+    """allow_guess() for async views
+
+    A shared cache is used in a thread so as not to block the event loop; the
+    in-process buckets are quick enough to use directly.
+    """
+    if settings.GUESS_RATE_CACHE_ALIAS:
+        return await sync_to_async(allow_guess)(user_id, team_id, puzzle_id)
+    return allow_guess(user_id, team_id, puzzle_id)
+
+
+def reset():
+    """Forget the in-process buckets"""
+    _local_buckets.clear()
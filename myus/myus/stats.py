@@ -0,0 +1,144 @@
+"""Per-puzzle statistics of a hunt, for its organizers
+
+Everything is derived from two grouped queries over the hunt's guesses: one
+row per (puzzle, team) with the team's guess count and solve time, and one row
+per (puzzle, wrong answer) with how often it was guessed. These rows are kept
+in the cache, and each refresh only queries the guesses made since the last
+one and merges them in. Deleting guesses, teams or puzzles bumps the hunt's
+HUNT_STATS version, which makes the next refresh start from scratch.
+"""
+
+import time
+from collections import Counter
+from datetime import timedelta
+from statistics import median
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, Max, Q
+from django.utils import timezone
+
+from .models import Guess
+from .versions import HUNT_STATS, get_version
+
+# Guess IDs are assigned before their transactions commit, so a guess can show
+# up after guesses with higher IDs; it won't be that late, though
+SETTLE_TIME = timedelta(seconds=10)
+
+TOP_WRONG_ANSWERS = 5
+
+# upper bounds of the guesses-per-team histogram buckets
+GUESS_BUCKETS = [1, 2, 3, 5, 10, None]
+
+
+def _bucket_label(index):
+    low = GUESS_BUCKETS[index - 1] + 1 if index else 1
+    high = GUESS_BUCKETS[index]
+    if high is None:
+        return f"{low}+"
+    if low == high:
+        return str(low)
+    return f"{low}–{high}"
+
+
+GUESS_BUCKET_LABELS = [_bucket_label(i) for i in range(len(GUESS_BUCKETS))]
+
+
+def _bucket(count):
+    for i, high in enumerate(GUESS_BUCKETS):
+        if high is None or count <= high:
+            return i
+
+
+class PuzzleStats:
+    def __init__(self, puzzle):
+        self.puzzle = puzzle
+        self.guesses = 0
+        self.teams = 0
+        self.solves = 0
+        self.median_solve_time = None
+        self.guess_distribution = [0] * len(GUESS_BUCKETS)
+        self.top_wrong_answers = []
+
+
+def _new_state():
+    return {"last_id": 0, "teams": {}, "wrong": {}}
+
+
+def _merge_new_guesses(hunt, state):
+    """Fold the guesses made since the state was last refreshed into it
+
+    Returns whether there were any.
+    """
+    guesses = Guess.objects.filter(
+        puzzle__hunt=hunt,
+        id__gt=state["last_id"],
+        time__lte=timezone.now() - SETTLE_TIME,
+    )
+
+    rows = guesses.values("puzzle_id", "team_id", "team__creation_time").annotate(
+        count=Count("id"),
+        solved_at=Max("time", filter=Q(correct=True)),
+        last_id=Max("id"),
+    )
+    changed = False
+    for row in rows:
+        changed = True
+        key = (row["puzzle_id"], row["team_id"])
+        count, solved_at, team_created = state["teams"].get(
+            key, (0, None, row["team__creation_time"])
+        )
+        state["teams"][key] = (
+            count + row["count"],
+            solved_at or row["solved_at"],
+            team_created,
+        )
+        state["last_id"] = max(state["last_id"], row["last_id"])
+
+    if changed:
+        wrong = guesses.filter(correct=False, id__lte=state["last_id"])
+        for row in wrong.values("puzzle_id", "guess").annotate(count=Count("id")):
+            answers = state["wrong"].setdefault(row["puzzle_id"], Counter())
+            answers[row["guess"]] += row["count"]
+
+    return changed
+
+
+def _summarize(hunt, puzzles, state):
+    stats = {puzzle.id: PuzzleStats(puzzle) for puzzle in puzzles}
+    solve_times = {puzzle_id: [] for puzzle_id in stats}
+
+    for (puzzle_id, _), (count, solved_at, team_created) in state["teams"].items():
+        puzzle_stats = stats.get(puzzle_id)
+        if puzzle_stats is None:
+            continue
+        puzzle_stats.guesses += count
+        puzzle_stats.teams += 1
+        puzzle_stats.guess_distribution[_bucket(count)] += 1
+        if solved_at is not None:
+            puzzle_stats.solves += 1
+            start = max(team_created, hunt.start_time or team_created)
+            solve_times[puzzle_id].append(solved_at - start)
+
+    for puzzle_id, puzzle_stats in stats.items():
+        if solve_times[puzzle_id]:
+            puzzle_stats.median_solve_time = median(solve_times[puzzle_id])
+        puzzle_stats.top_wrong_answers = (
+            state["wrong"].get(puzzle_id, Counter()).most_common(TOP_WRONG_ANSWERS)
+        )
+
+    return [stats[puzzle.id] for puzzle in puzzles]
+
+
+def hunt_stats(hunt):
+    """The statistics of each of the hunt's puzzles, in hunt order"""
+    # the period in the key makes the state start over now and then, in case
+    # anything that doesn't bump the version has drifted it
+    period = int(time.time()) // settings.HUNT_STATS_CACHE_TIMEOUT
+    key = f"hunt-stats:{hunt.id}:{get_version(HUNT_STATS, hunt.id)}:{period}"
+    state = cache.get(key) or _new_state()
+    if _merge_new_guesses(hunt, state):
+        cache.set(key, state, settings.HUNT_STATS_CACHE_TIMEOUT)
+
+    puzzles = list(hunt.puzzles.order_by("order", "name"))
+    return _summarize(hunt, puzzles, state)
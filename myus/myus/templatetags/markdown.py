@@ -1,4 +1,9 @@
+from functools import lru_cache, wraps
+from hashlib import sha256
+
 from django import template
+from django.conf import settings
+from django.core.cache import caches
 from django.utils.safestring import mark_safe
 from markdown import markdown as convert_markdown
 from bleach import Cleaner
@@ -49,22 +54,56 @@ SAFE_ATTRS = {
 cleaner = Cleaner(tags=SAFE_TAGS, attributes=SAFE_ATTRS, filters=[LinkifyFilter])
 
 
+def cached_rendering(render):
+    """Cache the output of a rendering function by the text it renders
+
+    Results are kept in a per-process LRU cache of MARKDOWN_CACHE_SIZE entries
+    and, if MARKDOWN_CACHE_ALIAS names a configured cache, also shared through
+    that cache for MARKDOWN_CACHE_TIMEOUT seconds.
+    """
+
+    @lru_cache(maxsize=settings.MARKDOWN_CACHE_SIZE)
+    def render_cached(text):
+        if not settings.MARKDOWN_CACHE_ALIAS:
+            return render(text)
+
+        shared_cache = caches[settings.MARKDOWN_CACHE_ALIAS]
+        key = "markdown:{}:{}".format(
+            render.__name__, sha256(text.encode("utf-8")).hexdigest()
+        )
+        output = shared_cache.get(key)
+        if output is None:
+            output = render(text)
+            shared_cache.set(key, output, settings.MARKDOWN_CACHE_TIMEOUT)
+        return output
+
+    @wraps(render)
+    def wrapper(text):
+        return render_cached(str(text))
+
+    wrapper.cache_clear = render_cached.cache_clear
+    return wrapper
+
+
 @register.filter
 def clean(text):
     return mark_safe(cleaner.clean(text))
 
 
 @register.filter
+@cached_rendering
 def markdown(text):
     return mark_safe(cleaner.clean(convert_markdown(text, extensions=["extra"])))
 
 
 @register.filter
+@cached_rendering
 def raw_markdown(text):
     return convert_markdown(text, extensions=["extra"])
 
 
 @register.filter
+@cached_rendering
 def markdown_srcdoc(text):
     puzzle_iframe = render_to_string(
         "view_puzzle_iframe.html",
@@ -1,11 +1,46 @@
-from datetime import datetime, timezone
+import json
+import os
+import tempfile
+from datetime import datetime, timedelta, timezone
 from http import HTTPStatus
+from io import StringIO
+from unittest import mock
 
+from asgiref.sync import async_to_sync
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.core.management import CommandError, call_command
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connection
 from django.urls import reverse
-from django.test import TestCase
+from django.utils.crypto import get_random_string
+from prometheus_client import REGISTRY
+from django.test import LiveServerTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 
+from myus import events, instrumentation, ratelimit
 from myus.forms import NewHuntForm
-from myus.models import Hunt, Puzzle, User
+from myus.hunt_io import export_hunt, import_hunt
+from myus.management.commands.loadtest import Results, summarize
+from myus.profiling import profile_token
+from myus.stats import hunt_stats
+from myus.templatetags import markdown as markdown_filters
+from myus.models import (
+    ExtraGuessGrant,
+    Guess,
+    GuessResponse,
+    Hunt,
+    Puzzle,
+    Team,
+    User,
+)
+from myus.views import (
+    TOO_MANY_GUESSES,
+    HuntContext,
+    hunt_event_messages,
+    with_hunt_membership,
+)
 
 
 class TestViewHunt(TestCase):
@@ -27,6 +62,31 @@ class TestViewHunt(TestCase):
         self.assertEqual(res.status_code, HTTPStatus.OK)
         self.assertTemplateUsed(res, "view_hunt.html")
 
+    def test_view_hunt_puzzle_counts(self):
+        """The hunt page counts each puzzle's solves and guesses across all teams"""
+        puzzle = Puzzle.objects.create(
+            name="Test Puzzle", slug="test-puzzle", hunt=self.hunt, answer="ANSWER"
+        )
+        user = User.objects.create_user(username="solver")
+        for i in range(3):
+            team = Team.objects.create(name=f"Team {i}", hunt=self.hunt)
+            for guess in ["WRONG", "ANSWER"][: i + 1]:
+                Guess.objects.create(
+                    guess=guess,
+                    team=team,
+                    puzzle=puzzle,
+                    correct=guess == "ANSWER",
+                    counts_as_guess=True,
+                )
+        team.members.add(user)
+        self.client.force_login(user)
+        res = self.client.get(
+            reverse(self.view_name, args=[self.hunt.id, self.hunt.slug])
+        )
+        [puzzle] = res.context["puzzles"]
+        self.assertEqual((puzzle.solve_count, puzzle.guess_count), (2, 5))
+        self.assertEqual(puzzle.correct_guess, "ANSWER")
+
     def test_view_hunt_with_id_only_redirects_to_id_and_slug(self):
         """Visiting the view_hunt endpoint with only ID in the URL redirects to the URL with ID and slug"""
         res = self.client.get(reverse(self.view_name, args=[self.hunt.id]))
@@ -108,6 +168,1491 @@ class TestViewPuzzle(TestCase):
         self.assertRedirects(res, self.correct_url)
 
 
+class TestHuntContext(TestCase):
+    """Test the per-request hunt context set up by the slug decorators"""
+
+    def setUp(self):
+        self.hunt = Hunt.objects.create(name="Test Hunt", slug="test-hunt")
+        self.organizer = User.objects.create_user(username="organizer")
+        self.hunt.organizers.add(self.organizer)
+        self.solver = User.objects.create_user(username="solver")
+        self.team = Team.objects.create(name="Test Team", hunt=self.hunt)
+        self.team.members.add(self.solver)
+        self.url = reverse("view_hunt", args=[self.hunt.id, self.hunt.slug])
+
+    def test_organizer_is_recognized(self):
+        """Organizers are flagged as such and have no team"""
+        self.client.force_login(self.organizer)
+        res = self.client.get(self.url)
+        self.assertTrue(res.context["is_organizer"])
+        self.assertIsNone(res.context["team"])
+
+    def test_team_member_gets_their_team(self):
+        """Team members get their team and are not organizers"""
+        self.client.force_login(self.solver)
+        res = self.client.get(self.url)
+        self.assertFalse(res.context["is_organizer"])
+        self.assertEqual(res.context["team"], self.team)
+
+    def test_membership_is_loaded_with_the_hunt(self):
+        """Organizer status and team ID need no queries beyond loading the hunt"""
+        self.client.force_login(self.solver)
+        res = self.client.get(self.url)
+        hunt_context = res.wsgi_request.hunt_context
+        with self.assertNumQueries(0):
+            self.assertFalse(hunt_context.is_organizer)
+            self.assertEqual(hunt_context.team_id, self.team.id)
+            self.assertEqual(hunt_context.team.hunt, self.hunt)
+
+    def test_team_is_loaded_once_in_async_views(self):
+        """The team fetched by ateam() is cached for later uses"""
+        hunt = with_hunt_membership(Hunt.objects.all(), self.solver).get()
+        hunt_context = HuntContext(self.solver, hunt, hunt)
+        self.assertEqual(async_to_sync(hunt_context.ateam)(), self.team)
+        with self.assertNumQueries(0):
+            self.assertEqual(hunt_context.team, self.team)
+
+
+class TestPuzzleGuessing(TestCase):
+    """Test guessing on the view_puzzle endpoint"""
+
+    def setUp(self):
+        ratelimit.reset()
+        self.hunt = Hunt.objects.create(
+            name="Test Hunt", slug="test-hunt", guess_limit=2
+        )
+        self.puzzle = Puzzle.objects.create(
+            name="Test Puzzle", slug="test-puzzle", hunt=self.hunt, answer="Answer"
+        )
+        self.user = User.objects.create_user(username="solver")
+        self.team = Team.objects.create(name="Test Team", hunt=self.hunt)
+        self.team.members.add(self.user)
+        self.client.force_login(self.user)
+        self.url = reverse(
+            "view_puzzle",
+            args=[self.hunt.id, self.hunt.slug, self.puzzle.id, self.puzzle.slug],
+        )
+
+    def test_guesses_remaining_include_grants(self):
+        """Extra guess grants are added to the hunt's guess limit"""
+        ExtraGuessGrant.objects.create(
+            team=self.team, puzzle=self.puzzle, extra_guesses=3
+        )
+        self.client.post(self.url, {"guess": "wrong"})
+        res = self.client.get(self.url)
+        self.assertEqual(res.context["guesses_remaining"], 4)
+        self.assertFalse(res.context["guesses_at_limit"])
+
+    def test_guesses_at_limit(self):
+        """Teams can't guess once they've used up their guesses"""
+        self.client.post(self.url, {"guess": "wrong"})
+        self.client.post(self.url, {"guess": "also wrong"})
+        res = self.client.post(self.url, {"guess": "answer"})
+        self.assertTrue(res.context["guesses_at_limit"])
+        self.assertFalse(Guess.objects.filter(correct=True).exists())
+
+    def test_duplicate_guess_is_rejected(self):
+        """Guessing the same (normalized) answer twice is rejected"""
+        self.client.post(self.url, {"guess": "wrong"})
+        res = self.client.post(self.url, {"guess": "W R O N G"})
+        self.assertFormError(
+            res.context["guess_form"], "guess", "You have already guessed that answer!"
+        )
+        self.assertEqual(Guess.objects.count(), 1)
+
+    def test_guess_response_matches_normalized_guess(self):
+        """A guess matching a special response gets it and doesn't count as a guess"""
+        GuessResponse.objects.create(
+            puzzle=self.puzzle, guess="Keep going", response="Almost there!"
+        )
+        self.client.post(self.url, {"guess": "keep-going"})
+        guess = Guess.objects.get()
+        self.assertEqual(guess.response, "Almost there!")
+        self.assertFalse(guess.counts_as_guess)
+
+    def test_correct_guess_solves_puzzle(self):
+        """A correct guess marks the puzzle as solved"""
+        self.client.post(self.url, {"guess": "answer!"})
+        res = self.client.get(self.url)
+        self.assertTrue(res.context["solved"])
+        self.assertEqual([guess.guess for guess in res.context["guesses"]], ["ANSWER"])
+
+
+class TestGuessRateLimit(TestCase):
+    """Test throttling of guess submissions"""
+
+    def setUp(self):
+        ratelimit.reset()
+        self.hunt = Hunt.objects.create(name="Test Hunt", slug="test-hunt")
+        self.puzzle = Puzzle.objects.create(
+            name="Test Puzzle", slug="test-puzzle", hunt=self.hunt, answer="Answer"
+        )
+        self.user = User.objects.create_user(username="solver")
+        self.team = Team.objects.create(name="Test Team", hunt=self.hunt)
+        self.team.members.add(self.user)
+        self.client.force_login(self.user)
+        self.url = reverse(
+            "view_puzzle",
+            args=[self.hunt.id, self.hunt.slug, self.puzzle.id, self.puzzle.slug],
+        )
+
+    @override_settings(GUESS_RATE_TEAM_BURST=2, GUESS_RATE_TEAM_PER_MINUTE=1)
+    def test_burst_is_throttled(self):
+        """Guesses beyond the team's burst are rejected without being recorded"""
+        self.client.post(self.url, {"guess": "one"})
+        self.client.post(self.url, {"guess": "two"})
+        res = self.client.post(self.url, {"guess": "three"})
+        self.assertEqual(res.status_code, 429)
+        self.assertEqual(res.context["error"], TOO_MANY_GUESSES)
+        self.assertEqual(Guess.objects.count(), 2)
+
+    @override_settings(GUESS_RATE_TEAM_BURST=1, GUESS_RATE_TEAM_PER_MINUTE=1)
+    def test_throttled_guess_skips_loading_the_team(self):
+        """A throttled guess is turned away before the team and its guesses are loaded"""
+        self.client.post(self.url, {"guess": "one"})
+        with CaptureQueriesContext(connection) as queries:
+            res = self.client.post(self.url, {"guess": "two"})
+        self.assertEqual(res.status_code, 429)
+        # the session, the user and the puzzle with the user's team ID
+        self.assertEqual(len(queries), 3)
+
+    @override_settings(GUESS_RATE_TEAM_BURST=1, GUESS_RATE_TEAM_PER_MINUTE=60)
+    def test_bucket_refills(self):
+        """Tokens come back over time"""
+        with mock.patch("myus.ratelimit.time.time", return_value=1000.0):
+            self.assertTrue(ratelimit.allow_guess(1, 1, 1))
+            self.assertFalse(ratelimit.allow_guess(1, 1, 1))
+        with mock.patch("myus.ratelimit.time.time", return_value=1001.0):
+            self.assertTrue(ratelimit.allow_guess(1, 1, 1))
+
+    @override_settings(GUESS_RATE_USER_BURST=1, GUESS_RATE_USER_PER_MINUTE=1)
+    def test_user_limit_spans_puzzles(self):
+        """The per-user bucket is shared by all of the user's guesses"""
+        self.assertTrue(ratelimit.allow_guess(1, 1, 1))
+        self.assertFalse(ratelimit.allow_guess(1, 2, 2))
+        self.assertTrue(ratelimit.allow_guess(2, 1, 2))
+
+    @override_settings(
+        GUESS_RATE_CACHE_ALIAS="default",
+        GUESS_RATE_TEAM_BURST=1,
+        GUESS_RATE_TEAM_PER_MINUTE=1,
+    )
+    def test_shared_buckets(self):
+        """Buckets can be kept in a shared cache instead of process memory"""
+        cache.clear()
+        self.assertTrue(ratelimit.allow_guess(1, 1, 1))
+        ratelimit.reset()
+        self.assertFalse(ratelimit.allow_guess(1, 1, 1))
+
+
+class TestSubmitGuessJson(TestCase):
+    """Test the asynchronous JSON guess submission endpoint"""
+
+    def setUp(self):
+        ratelimit.reset()
+        self.hunt = Hunt.objects.create(
+            name="Test Hunt", slug="test-hunt", guess_limit=2
+        )
+        self.puzzle = Puzzle.objects.create(
+            name="Test Puzzle", slug="test-puzzle", hunt=self.hunt, answer="Answer"
+        )
+        self.user = User.objects.create_user(username="solver")
+        self.team = Team.objects.create(name="Test Team", hunt=self.hunt)
+        self.team.members.add(self.user)
+        self.url = reverse(
+            "submit_guess_json",
+            args=[self.hunt.id, self.hunt.slug, self.puzzle.id, self.puzzle.slug],
+        )
+
+    def test_correct_guess(self):
+        """A correct guess is recorded and reported as correct"""
+        self.client.force_login(self.user)
+        res = self.client.post(self.url, {"guess": "answer"})
+        self.assertEqual(res.status_code, HTTPStatus.OK)
+        self.assertEqual(
+            res.json(),
+            {
+                "success": True,
+                "guess": "ANSWER",
+                "correct": True,
+                "response": "",
+                "guesses_remaining": 1,
+            },
+        )
+        self.team.refresh_from_db()
+        self.assertEqual(self.team.solve_count, 1)
+
+    def test_duplicate_guess_is_rejected(self):
+        """Guessing the same answer twice is rejected"""
+        self.client.force_login(self.user)
+        self.client.post(self.url, {"guess": "wrong"})
+        res = self.client.post(self.url, {"guess": "wrong"})
+        self.assertEqual(res.status_code, HTTPStatus.BAD_REQUEST)
+        self.assertEqual(res.json()["error"], "You have already guessed that answer!")
+        self.assertEqual(Guess.objects.count(), 1)
+
+    def test_anonymous_user_is_rejected(self):
+        """Users who aren't logged in can't guess"""
+        res = self.client.post(self.url, {"guess": "answer"})
+        self.assertEqual(res.status_code, HTTPStatus.FORBIDDEN)
+        self.assertFalse(Guess.objects.exists())
+
+    def test_missing_puzzle_is_a_json_error(self):
+        """Puzzles that don't exist or can't be seen get a JSON 404"""
+        self.client.force_login(self.user)
+        hidden = Puzzle.objects.create(
+            name="Hidden", slug="hidden", hunt=self.hunt, progress_threshold=1
+        )
+        for puzzle_id in [hidden.id, hidden.id + 1]:
+            res = self.client.post(
+                reverse("submit_guess_json", args=[self.hunt.id, puzzle_id]),
+                {"guess": "answer"},
+            )
+            self.assertEqual(res.status_code, HTTPStatus.NOT_FOUND)
+            self.assertFalse(res.json()["success"])
+
+    @override_settings(
+        GUESS_RATE_CACHE_ALIAS="default",
+        GUESS_RATE_TEAM_BURST=1,
+        GUESS_RATE_TEAM_PER_MINUTE=1,
+    )
+    def test_throttled_with_shared_buckets(self):
+        """Guesses are throttled with buckets in the shared cache too"""
+        cache.clear()
+        self.client.force_login(self.user)
+        self.client.post(self.url, {"guess": "wrong"})
+        res = self.client.post(self.url, {"guess": "other"})
+        self.assertEqual(res.status_code, HTTPStatus.TOO_MANY_REQUESTS)
+
+    def test_get_is_not_allowed(self):
+        """The endpoint only accepts POST requests"""
+        self.client.force_login(self.user)
+        res = self.client.get(self.url)
+        self.assertEqual(res.status_code, HTTPStatus.METHOD_NOT_ALLOWED)
+
+
+class TestPuzzleLog(TestCase):
+    """Test the organizers' guess log for a puzzle"""
+
+    def setUp(self):
+        self.hunt = Hunt.objects.create(name="Test Hunt", slug="test-hunt")
+        self.puzzle = Puzzle.objects.create(
+            name="Test Puzzle", slug="test-puzzle", hunt=self.hunt, answer="ANSWER"
+        )
+        self.organizer = User.objects.create_user(username="organizer")
+        self.hunt.organizers.add(self.organizer)
+        self.client.force_login(self.organizer)
+        self.teams = [
+            Team.objects.create(name=f"Team {i}", hunt=self.hunt) for i in range(3)
+        ]
+        for team in self.teams:
+            Guess.objects.create(
+                guess="WRONG",
+                team=team,
+                puzzle=self.puzzle,
+                correct=False,
+                counts_as_guess=True,
+            )
+        Guess.objects.create(
+            guess="ANSWER",
+            team=self.teams[0],
+            puzzle=self.puzzle,
+            correct=True,
+            counts_as_guess=True,
+        )
+        # ties on time are broken by ID
+        Guess.objects.update(time=datetime(2024, 1, 1, tzinfo=timezone.utc))
+        self.url = reverse(
+            "view_puzzle_log",
+            args=[self.hunt.id, self.hunt.slug, self.puzzle.id, self.puzzle.slug],
+        )
+
+    def test_log_is_paginated(self):
+        """Pages follow each other in (time, id) order without gaps or repeats"""
+        seen = []
+        query = ""
+        with mock.patch("myus.views.PUZZLE_LOG_PAGE_SIZE", 3):
+            while query is not None:
+                res = self.client.get(self.url + "?" + query)
+                seen += [guess.id for guess in res.context["guesses"]]
+                query = res.context["next_page"]
+        self.assertEqual(seen, sorted(Guess.objects.values_list("id", flat=True)))
+
+    def test_log_page_queries(self):
+        """A page's teams are loaded with its guesses"""
+        # session, user, puzzle, the team filter's choices and the guesses
+        with self.assertNumQueries(5):
+            self.client.get(self.url)
+
+    def test_log_filters(self):
+        """The log can be limited to a team and to correct or incorrect guesses"""
+        res = self.client.get(self.url, {"team": self.teams[0].id})
+        self.assertEqual(len(res.context["guesses"]), 2)
+        res = self.client.get(self.url, {"team": self.teams[0].id, "correct": "false"})
+        self.assertEqual([g.guess for g in res.context["guesses"]], ["WRONG"])
+
+    def test_log_csv_export(self):
+        """The filtered log can be downloaded as a streamed CSV file"""
+        res = self.client.get(self.url, {"correct": "true", "format": "csv"})
+        self.assertEqual(res["Content-Type"], "text/csv")
+        lines = b"".join(res.streaming_content).decode().splitlines()
+        self.assertEqual(lines[0], "Team,User,Guess,Response,Time,Correct?")
+        self.assertEqual(len(lines), 2)
+        self.assertTrue(lines[1].startswith("Team 0,,ANSWER,"))
+
+
+class TestGuessExport(TestCase):
+    """Test the hunt-wide guess export"""
+
+    def setUp(self):
+        self.hunt = Hunt.objects.create(name="Test Hunt", slug="test-hunt")
+        self.organizer = User.objects.create_user(username="organizer")
+        self.hunt.organizers.add(self.organizer)
+        self.client.force_login(self.organizer)
+        for hunt in [self.hunt, Hunt.objects.create(name="Other Hunt", slug="other")]:
+            puzzle = Puzzle.objects.create(
+                name="Test Puzzle", slug="test-puzzle", hunt=hunt, answer="ANSWER"
+            )
+            team = Team.objects.create(name="Test Team", hunt=hunt)
+            Guess.objects.create(
+                guess="ANSWER",
+                team=team,
+                user=self.organizer,
+                puzzle=puzzle,
+                correct=True,
+                response="Correct!",
+                counts_as_guess=True,
+            )
+        self.url = reverse("export_guesses", args=[self.hunt.id, self.hunt.slug])
+
+    def test_export_csv(self):
+        """Organizers can download the hunt's guesses as CSV"""
+        res = self.client.get(self.url)
+        lines = b"".join(res.streaming_content).decode().splitlines()
+        self.assertEqual(lines[0], "team,user,puzzle,guess,correct,response,time")
+        self.assertEqual(len(lines), 2)
+        self.assertTrue(
+            lines[1].startswith("Test Team,organizer,Test Puzzle,ANSWER,True,Correct!,")
+        )
+
+    def test_export_jsonl(self):
+        """Guesses can also be downloaded as JSON Lines"""
+        res = self.client.get(self.url, {"format": "jsonl"})
+        rows = [
+            json.loads(line)
+            for line in b"".join(res.streaming_content).decode().splitlines()
+        ]
+        self.assertEqual(len(rows), 1)
+        self.assertEqual(rows[0]["team"], "Test Team")
+        self.assertIs(rows[0]["correct"], True)
+
+    def test_export_requires_organizer(self):
+        """Other users can't export guesses"""
+        self.client.force_login(User.objects.create_user(username="solver"))
+        res = self.client.get(self.url)
+        self.assertEqual(res.status_code, HTTPStatus.NOT_FOUND)
+
+
+class TestHuntImportExport(TestCase):
+    """Test exporting hunts and importing them in bulk"""
+
+    def setUp(self):
+        self.hunt = Hunt.objects.create(
+            name="Test Hunt", slug="test-hunt", description="Hunt!", guess_limit=5
+        )
+        self.puzzle = Puzzle.objects.create(
+            name="Test Puzzle", slug="test-puzzle", hunt=self.hunt, answer="ANSWER"
+        )
+        GuessResponse.objects.create(
+            puzzle=self.puzzle, guess="Keep going", response="Almost there!"
+        )
+
+    def puzzle_data(self, i):
+        return {
+            "name": f"Puzzle {i}",
+            "slug": f"puzzle-{i}",
+            "answer": f"ANSWER {i}",
+            "responses": [{"guess": f"Close {i}", "response": "Keep going!"}],
+        }
+
+    def test_round_trip(self):
+        """An exported hunt imports as a copy of itself"""
+        data = json.loads(json.dumps(export_hunt(self.hunt), cls=DjangoJSONEncoder))
+        hunt = import_hunt(data)
+        self.assertNotEqual(hunt.pk, self.hunt.pk)
+        self.assertEqual(hunt.guess_limit, 5)
+        self.assertEqual(export_hunt(hunt), export_hunt(self.hunt))
+        self.assertEqual(
+            GuessResponse.objects.get(puzzle__hunt=hunt).normalized_guess, "KEEPGOING"
+        )
+
+    def test_import_queries_do_not_grow_with_puzzles(self):
+        """Puzzles and responses are created in bulk"""
+        data = {"version": 1, "hunt": {"name": "New Hunt", "slug": "new"}}
+        data["hunt"]["description"] = "New!"
+        data["puzzles"] = [self.puzzle_data(i) for i in range(50)]
+        # the hunt (in its own savepoint), the puzzles and the responses
+        with self.assertNumQueries(7):
+            import_hunt(data)
+        self.assertEqual(
+            GuessResponse.objects.filter(puzzle__hunt__slug="new").count(), 50
+        )
+
+    def test_import_updates_matching_puzzles(self):
+        """Puzzles are matched by slug, and their solvers' points follow them"""
+        team = Team.objects.create(name="Test Team", hunt=self.hunt)
+        Guess.objects.create(
+            guess="ANSWER",
+            team=team,
+            puzzle=self.puzzle,
+            correct=True,
+            counts_as_guess=True,
+        )
+        data = export_hunt(self.hunt)
+        data["puzzles"][0].update(points=3, responses=[])
+        data["puzzles"].append(self.puzzle_data(1))
+        import_hunt(data, self.hunt)
+
+        self.assertEqual(self.hunt.puzzles.count(), 2)
+        self.assertFalse(self.puzzle.guess_responses.exists())
+        team.refresh_from_db()
+        self.assertEqual(team.score, 3)
+
+    def test_invalid_import_changes_nothing(self):
+        """A description with an invalid puzzle is rejected as a whole"""
+        data = export_hunt(self.hunt)
+        data["hunt"]["name"] = "Renamed Hunt"
+        data["puzzles"].append({"name": "No Answer", "slug": "no-answer"})
+        with self.assertRaises(ValidationError):
+            import_hunt(data, self.hunt)
+        self.assertEqual(Hunt.objects.get().name, "Test Hunt")
+        self.assertEqual(Puzzle.objects.count(), 1)
+
+    def test_commands(self):
+        """The management commands export a hunt and import it for organizers"""
+        organizer = User.objects.create_user(username="organizer")
+        out = StringIO()
+        call_command("export_hunt", self.hunt.id, stdout=out)
+        with mock.patch("sys.stdin", StringIO(out.getvalue())):
+            call_command("import_hunt", "-", organizer=["organizer"], stdout=StringIO())
+        hunt = Hunt.objects.exclude(pk=self.hunt.pk).get()
+        self.assertEqual(list(hunt.organizers.all()), [organizer])
+        self.assertEqual(hunt.puzzles.get().slug, "test-puzzle")
+
+
+class TestHuntStats(TestCase):
+    """Test the organizers' puzzle statistics"""
+
+    def setUp(self):
+        cache.clear()
+        self.start = datetime(2024, 1, 1, tzinfo=timezone.utc)
+        self.hunt = Hunt.objects.create(
+            name="Test Hunt", slug="test-hunt", start_time=self.start
+        )
+        self.puzzle = Puzzle.objects.create(
+            name="Test Puzzle", slug="test-puzzle", hunt=self.hunt, answer="ANSWER"
+        )
+        self.teams = [
+            Team.objects.create(name=f"Team {i}", hunt=self.hunt) for i in range(3)
+        ]
+        Team.objects.update(creation_time=self.start)
+        self.guess(self.teams[0], "WRONG", hours=1)
+        self.guess(self.teams[0], "ANSWER", hours=2)
+        self.guess(self.teams[1], "ANSWER", hours=4)
+        self.guess(self.teams[2], "WRONG", hours=1)
+        self.guess(self.teams[2], "ALSO WRONG", hours=1)
+        self.guess(self.teams[2], "WRONGER", hours=1)
+
+    def guess(self, team, guess, hours):
+        guess = Guess.objects.create(
+            guess=guess,
+            team=team,
+            puzzle=self.puzzle,
+            correct=guess == "ANSWER",
+            counts_as_guess=True,
+        )
+        Guess.objects.filter(pk=guess.pk).update(
+            time=self.start + timedelta(hours=hours)
+        )
+        return guess
+
+    def test_puzzle_stats(self):
+        """Solves, guesses, solve times and wrong answers are summarized per puzzle"""
+        [stats] = hunt_stats(self.hunt)
+        self.assertEqual(stats.solves, 2)
+        self.assertEqual(stats.teams, 3)
+        self.assertEqual(stats.guesses, 6)
+        self.assertEqual(stats.median_solve_time, timedelta(hours=3))
+        self.assertEqual(stats.guess_distribution, [1, 1, 1, 0, 0, 0])
+        self.assertEqual(stats.top_wrong_answers[0], ("WRONG", 2))
+
+    def test_refresh_only_reads_new_guesses(self):
+        """Refreshing merges in new guesses, but not ones that may still be committing"""
+        hunt_stats(self.hunt)
+        self.guess(self.teams[2], "ANSWER", hours=5)
+        Guess.objects.create(
+            guess="RECENT",
+            team=self.teams[1],
+            puzzle=self.puzzle,
+            correct=False,
+            counts_as_guess=True,
+        )
+        with mock.patch("myus.stats._new_state") as new_state:
+            [stats] = hunt_stats(self.hunt)
+        new_state.assert_not_called()
+        self.assertEqual(stats.solves, 3)
+        self.assertEqual(stats.guesses, 7)
+
+    def test_deleting_guesses_rebuilds(self):
+        """Deleted guesses drop out of the statistics"""
+        hunt_stats(self.hunt)
+        with self.captureOnCommitCallbacks(execute=True):
+            Guess.objects.filter(team=self.teams[2]).first().delete()
+        [stats] = hunt_stats(self.hunt)
+        self.assertEqual(stats.guesses, 5)
+
+    def test_stats_page_requires_organizer(self):
+        """Only organizers can see the statistics"""
+        url = reverse("view_hunt_stats", args=[self.hunt.id, self.hunt.slug])
+        organizer = User.objects.create_user(username="organizer")
+        self.client.force_login(organizer)
+        self.assertEqual(self.client.get(url).status_code, HTTPStatus.NOT_FOUND)
+        self.hunt.organizers.add(organizer)
+        self.assertContains(self.client.get(url), "<samp>WRONG</samp> (2)")
+
+
+class TestTeamStats(TestCase):
+    """Test the progress points and leaderboard standings stored on teams"""
+
+    def setUp(self):
+        self.hunt = Hunt.objects.create(name="Test Hunt", slug="test-hunt")
+        self.puzzle = Puzzle.objects.create(
+            name="Test Puzzle",
+            slug="test-puzzle",
+            hunt=self.hunt,
+            answer="ANSWER",
+            progress_points=2,
+        )
+        self.team = Team.objects.create(name="Test Team", hunt=self.hunt)
+        cache.clear()
+
+    def solve(self, puzzle):
+        Guess.objects.create(
+            guess=puzzle.answer,
+            team=self.team,
+            puzzle=puzzle,
+            correct=True,
+            counts_as_guess=True,
+        )
+        self.team.refresh_from_db()
+
+    def test_correct_guess_adds_progress_points(self):
+        """A correct guess adds the puzzle's progress points to the team"""
+        self.solve(self.puzzle)
+        self.assertEqual(self.team.progress_points, 2)
+        self.assertEqual(self.team.progress(), 2)
+
+    def test_incorrect_guess_does_not_add_progress_points(self):
+        """An incorrect guess leaves the team's progress points alone"""
+        Guess.objects.create(
+            guess="WRONG",
+            team=self.team,
+            puzzle=self.puzzle,
+            correct=False,
+            counts_as_guess=True,
+        )
+        self.team.refresh_from_db()
+        self.assertEqual(self.team.progress_points, 0)
+
+    def test_changing_puzzle_progress_points_updates_solvers(self):
+        """Editing a solved puzzle's progress points updates the teams that solved it"""
+        self.solve(self.puzzle)
+        self.puzzle.progress_points = 5
+        self.puzzle.save()
+        self.team.refresh_from_db()
+        self.assertEqual(self.team.progress_points, 5)
+
+    def test_progress_respects_hunt_progress_floor(self):
+        """A team's progress is never below the hunt's progress floor"""
+        self.solve(self.puzzle)
+        self.hunt.progress_floor = 10
+        self.hunt.save()
+        self.team.refresh_from_db()
+        self.assertEqual(self.team.progress(), 10)
+
+    def test_rebuild_team_stats_command_fixes_drift(self):
+        """The rebuild_team_stats command recomputes progress points from guesses"""
+        self.solve(self.puzzle)
+        Team.objects.filter(pk=self.team.pk).update(progress_points=100)
+        call_command("rebuild_team_stats", stdout=StringIO())
+        self.team.refresh_from_db()
+        self.assertEqual(self.team.progress_points, 2)
+
+    def test_correct_guess_updates_standings(self):
+        """A correct guess updates the team's score, solve count and last solve"""
+        self.puzzle.points = 3
+        self.puzzle.save()
+        self.solve(self.puzzle)
+        guess = Guess.objects.get(team=self.team, correct=True)
+        self.assertEqual(self.team.score, 3)
+        self.assertEqual(self.team.solve_count, 1)
+        self.assertEqual(self.team.last_solve, guess.time)
+        self.assertEqual(self.team.solve_time, guess.time - self.team.creation_time)
+
+    def test_deleting_correct_guess_rebuilds_standings(self):
+        """Deleting a correct guess takes its points away from the team"""
+        self.solve(self.puzzle)
+        Guess.objects.get(team=self.team, correct=True).delete()
+        self.team.refresh_from_db()
+        self.assertEqual(self.team.score, 0)
+        self.assertEqual(self.team.solve_count, 0)
+        self.assertIsNone(self.team.last_solve)
+        self.assertEqual(self.team.progress_points, 0)
+
+    def test_deleting_guesses_in_bulk_rebuilds_standings(self):
+        """Queryset deletes, as in the admin, keep standings and counters in sync"""
+        self.solve(self.puzzle)
+        Guess.objects.filter(team=self.team).delete()
+        self.team.refresh_from_db()
+        self.puzzle.refresh_from_db()
+        self.assertEqual((self.team.score, self.team.solve_count), (0, 0))
+        self.assertEqual(self.puzzle.solve_count, 0)
+
+    def test_deleting_solved_puzzle_rebuilds_standings(self):
+        """Deleting a puzzle takes its points away from the teams that solved it"""
+        self.solve(self.puzzle)
+        Puzzle.objects.filter(pk=self.puzzle.pk).delete()
+        self.team.refresh_from_db()
+        self.assertEqual((self.team.score, self.team.progress_points), (0, 0))
+
+    def test_solves_recorded_out_of_order(self):
+        """A solve that commits after a later one doesn't move the last solve back"""
+        self.solve(self.puzzle)
+        last_solve = self.team.last_solve
+        other_puzzle = Puzzle.objects.create(
+            name="Other Puzzle", slug="other-puzzle", hunt=self.hunt, answer="OTHER"
+        )
+        with mock.patch(
+            "django.utils.timezone.now", return_value=last_solve - timedelta(minutes=1)
+        ):
+            self.solve(other_puzzle)
+        self.assertEqual(self.team.last_solve, last_solve)
+        self.assertEqual(self.team.solve_time, last_solve - self.team.creation_time)
+
+        stored = Team.objects.values("last_solve", "solve_time").get(pk=self.team.pk)
+        Team.objects.filter(pk=self.team.pk).rebuild_stats()
+        self.assertEqual(
+            Team.objects.values("last_solve", "solve_time").get(pk=self.team.pk),
+            stored,
+        )
+
+    def test_changing_hunt_start_time_updates_solve_time(self):
+        """Moving the hunt start time recomputes the teams' solve times"""
+        self.solve(self.puzzle)
+        Team.objects.filter(pk=self.team.pk).update(
+            creation_time=self.team.last_solve - timedelta(hours=2)
+        )
+        self.hunt.start_time = self.team.last_solve - timedelta(hours=1)
+        self.hunt.save()
+        self.team.refresh_from_db()
+        self.assertEqual(self.team.solve_time, timedelta(hours=1))
+
+    def test_leaderboard_orders_by_standings(self):
+        """The leaderboard lists teams by score"""
+        other_team = Team.objects.create(name="Other Team", hunt=self.hunt)
+        self.solve(self.puzzle)
+        res = self.client.get(
+            reverse("leaderboard", args=[self.hunt.id, self.hunt.slug])
+        )
+        self.assertEqual(list(res.context["teams"]), [self.team, other_team])
+
+
+class TestPuzzleCounters(TestCase):
+    """Test the solve and guess counters stored on puzzles"""
+
+    def setUp(self):
+        self.hunt = Hunt.objects.create(name="Test Hunt", slug="test-hunt")
+        self.puzzle = Puzzle.objects.create(
+            name="Test Puzzle", slug="test-puzzle", hunt=self.hunt, answer="ANSWER"
+        )
+        self.team = Team.objects.create(name="Test Team", hunt=self.hunt)
+
+    def guess(self, guess):
+        return Guess.objects.create(
+            guess=guess,
+            team=self.team,
+            puzzle=self.puzzle,
+            correct=guess == "ANSWER",
+            counts_as_guess=True,
+        )
+
+    def test_guesses_update_counters(self):
+        """Every guess counts, and correct guesses count as solves"""
+        self.guess("WRONG")
+        solve = self.guess("ANSWER")
+        self.puzzle.refresh_from_db()
+        self.assertEqual((self.puzzle.solve_count, self.puzzle.guess_count), (1, 2))
+        self.assertEqual(self.puzzle.last_solve_time, solve.time)
+
+    def test_solves_recorded_out_of_order(self):
+        """A solve that commits after a later one doesn't move the last solve time back"""
+        solve = self.guess("ANSWER")
+        other_team = Team.objects.create(name="Other Team", hunt=self.hunt)
+        with mock.patch(
+            "django.utils.timezone.now", return_value=solve.time - timedelta(minutes=1)
+        ):
+            Guess.objects.create(
+                guess="ANSWER",
+                team=other_team,
+                puzzle=self.puzzle,
+                correct=True,
+                counts_as_guess=True,
+            )
+        self.puzzle.refresh_from_db()
+        self.assertEqual(self.puzzle.last_solve_time, solve.time)
+
+    def test_deleting_guess_updates_counters(self):
+        """Deleting a guess recomputes the puzzle's counters"""
+        self.guess("WRONG")
+        self.guess("ANSWER").delete()
+        self.puzzle.refresh_from_db()
+        self.assertEqual((self.puzzle.solve_count, self.puzzle.guess_count), (0, 1))
+        self.assertIsNone(self.puzzle.last_solve_time)
+
+    def test_deleting_team_updates_counters(self):
+        """Deleting a team recomputes the counters of the puzzles it guessed on"""
+        other_team = Team.objects.create(name="Other Team", hunt=self.hunt)
+        Guess.objects.create(
+            guess="WRONG",
+            team=other_team,
+            puzzle=self.puzzle,
+            correct=False,
+            counts_as_guess=True,
+        )
+        self.guess("ANSWER")
+        self.team.delete()
+        self.puzzle.refresh_from_db()
+        self.assertEqual((self.puzzle.solve_count, self.puzzle.guess_count), (0, 1))
+        self.assertIsNone(self.puzzle.last_solve_time)
+
+    def test_rebuild_command(self):
+        """The rebuild_puzzle_counters command repairs counters that have drifted"""
+        self.guess("ANSWER")
+        Puzzle.objects.update(solve_count=5, guess_count=0)
+        out = StringIO()
+        call_command("rebuild_puzzle_counters", hunt=self.hunt.id, stdout=out)
+        self.assertIn("Rebuilt counters for 1 puzzle(s)", out.getvalue())
+        self.puzzle.refresh_from_db()
+        self.assertEqual((self.puzzle.solve_count, self.puzzle.guess_count), (1, 1))
+
+
+class TestLeaderboardCache(TestCase):
+    """Test caching of the rendered leaderboard"""
+
+    def setUp(self):
+        self.hunt = Hunt.objects.create(name="Test Hunt", slug="test-hunt")
+        self.puzzle = Puzzle.objects.create(
+            name="Test Puzzle", slug="test-puzzle", hunt=self.hunt, answer="ANSWER"
+        )
+        self.team = Team.objects.create(name="Test Team", hunt=self.hunt)
+        self.url = reverse("leaderboard", args=[self.hunt.id, self.hunt.slug])
+        cache.clear()
+
+    def test_leaderboard_is_served_from_cache(self):
+        """Changes that don't bump the leaderboard version aren't shown until the cache expires"""
+        self.client.get(self.url)
+        Team.objects.filter(pk=self.team.pk).update(name="Renamed Team")
+        res = self.client.get(self.url)
+        self.assertContains(res, "Test Team")
+        self.assertNotContains(res, "Renamed Team")
+
+    def test_solve_invalidates_cached_leaderboard(self):
+        """A correct guess makes the leaderboard render fresh standings"""
+        self.client.get(self.url)
+        with self.captureOnCommitCallbacks(execute=True):
+            Guess.objects.create(
+                guess="ANSWER",
+                team=self.team,
+                puzzle=self.puzzle,
+                correct=True,
+                counts_as_guess=True,
+            )
+        res = self.client.get(self.url)
+        self.assertContains(res, '<td class="score">1</td>')
+        self.assertContains(res, '<td class="solve-count">1</td>')
+
+
+class TestConditionalGet(TestCase):
+    """Test ETag handling on the hunt, puzzle and leaderboard pages"""
+
+    def setUp(self):
+        ratelimit.reset()
+        self.hunt = Hunt.objects.create(name="Test Hunt", slug="test-hunt")
+        self.puzzle = Puzzle.objects.create(
+            name="Test Puzzle", slug="test-puzzle", hunt=self.hunt, answer="ANSWER"
+        )
+        self.user = User.objects.create_user(username="solver")
+        self.team = Team.objects.create(name="Test Team", hunt=self.hunt)
+        self.team.members.add(self.user)
+        self.client.force_login(self.user)
+        self.puzzle_url = reverse(
+            "view_puzzle",
+            args=[self.hunt.id, self.hunt.slug, self.puzzle.id, self.puzzle.slug],
+        )
+        cache.clear()
+
+    def revalidate(self, url):
+        etag = self.client.get(url)["ETag"]
+        return self.client.get(url, headers={"if-none-match": etag})
+
+    def test_unchanged_pages_are_not_modified(self):
+        """Revalidating an unchanged page gets a 304 without rendering it"""
+        for url in [
+            reverse("view_hunt", args=[self.hunt.id, self.hunt.slug]),
+            self.puzzle_url,
+            reverse("leaderboard", args=[self.hunt.id, self.hunt.slug]),
+        ]:
+            res = self.revalidate(url)
+            self.assertEqual(res.status_code, HTTPStatus.NOT_MODIFIED)
+
+    def test_guess_changes_puzzle_page(self):
+        """The team's guesses on a puzzle change its page's ETag"""
+        etag = self.client.get(self.puzzle_url)["ETag"]
+        self.client.post(self.puzzle_url, {"guess": "wrong"})
+        res = self.client.get(self.puzzle_url, headers={"if-none-match": etag})
+        self.assertEqual(res.status_code, HTTPStatus.OK)
+
+    def test_puzzle_edit_changes_hunt_page(self):
+        """Editing a puzzle changes the hunt page's ETag"""
+        url = reverse("view_hunt", args=[self.hunt.id, self.hunt.slug])
+        etag = self.client.get(url)["ETag"]
+        self.puzzle.name = "Renamed Puzzle"
+        self.puzzle.save()
+        res = self.client.get(url, headers={"if-none-match": etag})
+        self.assertContains(res, "Renamed Puzzle")
+
+    def test_pages_differ_by_user(self):
+        """Another user doesn't get a 304 for the same page"""
+        etag = self.client.get(self.puzzle_url)["ETag"]
+        self.client.logout()
+        res = self.client.get(self.puzzle_url, headers={"if-none-match": etag})
+        self.assertEqual(res.status_code, HTTPStatus.OK)
+
+    def test_pages_differ_by_csrf_secret(self):
+        """A page isn't reused after the CSRF secret changes, as on logging in again"""
+        etag = self.client.get(self.puzzle_url)["ETag"]
+        self.client.cookies[settings.CSRF_COOKIE_NAME] = get_random_string(32)
+        res = self.client.get(self.puzzle_url, headers={"if-none-match": etag})
+        self.assertEqual(res.status_code, HTTPStatus.OK)
+
+
+class TestHuntEvents(TestCase):
+    """Test publishing and filtering of live hunt events"""
+
+    def setUp(self):
+        self.hunt = Hunt.objects.create(name="Test Hunt", slug="test-hunt")
+        self.puzzle = Puzzle.objects.create(
+            name="Test Puzzle", slug="test-puzzle", hunt=self.hunt, answer="ANSWER"
+        )
+        self.team = Team.objects.create(name="Test Team", hunt=self.hunt)
+
+    def solve(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            Guess.objects.create(
+                guess="ANSWER",
+                team=self.team,
+                puzzle=self.puzzle,
+                correct=True,
+                counts_as_guess=True,
+            )
+
+    def test_solve_publishes_event(self):
+        """A correct guess publishes the team's new standing once committed"""
+        with mock.patch("myus.events.publish") as publish:
+            self.solve()
+        publish.assert_called_once()
+        hunt_id, event = publish.call_args.args
+        self.assertEqual(hunt_id, self.hunt.id)
+        self.assertEqual(event["type"], "solve")
+        self.assertEqual(event["team"]["id"], self.team.id)
+        self.assertEqual(event["team"]["score"], 1)
+        self.assertEqual(event["puzzle"]["name"], "Test Puzzle")
+
+    def test_failed_publish_does_not_fail_the_guess(self):
+        """A solve is saved even if publishing it fails once committed"""
+        with mock.patch("myus.events.publish", side_effect=ConnectionError):
+            with self.assertLogs("django", "ERROR"):
+                self.solve()
+        self.assertTrue(Guess.objects.filter(team=self.team, correct=True).exists())
+
+    def test_publish_without_last_solve(self):
+        """A standing whose last solve was cleared is published without one"""
+        guess = Guess(team=self.team, puzzle=self.puzzle)
+        with mock.patch("myus.events.publish") as publish:
+            self.team.publish_solve(guess)
+        self.assertIsNone(publish.call_args.args[1]["team"]["last_solve"])
+
+    async def test_local_broker_delivers_to_hunt_subscribers(self):
+        """LocalBroker delivers events to subscribers of the event's hunt only"""
+        broker = events.LocalBroker()
+        async with broker.subscribe(1) as queue, broker.subscribe(2) as other:
+            broker.publish(1, {"type": "solve"})
+            self.assertEqual(await queue.get(), {"type": "solve"})
+            self.assertTrue(other.empty())
+
+    def test_local_broker_forgets_hunts_without_subscribers(self):
+        """Publishing to a hunt nobody is subscribed to doesn't keep an entry for it"""
+        broker = events.LocalBroker()
+        broker.publish(1, {"type": "solve"})
+        self.assertEqual(dict(broker._subscribers), {})
+
+    def test_messages_for_viewers(self):
+        """Solving teams and organizers see solves; everyone sees visible leaderboards"""
+        event = {
+            "type": "solve",
+            "team": {"id": self.team.id, "name": "Test Team"},
+            "puzzle": {"id": self.puzzle.id, "name": "Test Puzzle"},
+        }
+        public = hunt_event_messages(event, self.hunt, False, None)
+        self.assertEqual(len(public), 1)
+        self.assertTrue(public[0].startswith("event: leaderboard\n"))
+        solver = hunt_event_messages(event, self.hunt, False, self.team.id)
+        self.assertTrue(solver[1].startswith("event: solve\n"))
+
+        self.hunt.leaderboard_style = Hunt.LeaderboardStyle.HIDDEN
+        self.assertEqual(hunt_event_messages(event, self.hunt, False, None), [])
+        self.assertEqual(len(hunt_event_messages(event, self.hunt, True, None)), 2)
+
+
+class TestGuessIndexes(TestCase):
+    """Test that the database uses the indexes on Guess for the hot guess queries"""
+
+    def setUp(self):
+        hunt = Hunt.objects.create(name="Test Hunt", slug="test-hunt")
+        self.puzzle = Puzzle.objects.create(
+            name="Test Puzzle", slug="test-puzzle", hunt=hunt, answer="ANSWER"
+        )
+        self.team = Team.objects.create(name="Test Team", hunt=hunt)
+
+    def assertUsesIndex(self, queryset, index_name):
+        if connection.vendor == "postgresql":
+            # the tables are tiny, so sequential scans would otherwise win
+            with connection.cursor() as cursor:
+                cursor.execute("SET LOCAL enable_seqscan = off")
+        self.assertIn(index_name, queryset.explain())
+
+    def test_team_puzzle_guesses_use_index(self):
+        """A team's guesses on a puzzle are read in time order from an index"""
+        self.assertUsesIndex(
+            Guess.objects.filter(team=self.team, puzzle=self.puzzle).order_by("time"),
+            "guess_team_puzzle_time",
+        )
+
+    def test_puzzle_log_uses_index(self):
+        """All guesses on a puzzle are read in time order from an index"""
+        self.assertUsesIndex(
+            Guess.objects.filter(puzzle=self.puzzle).order_by("time"),
+            "guess_puzzle_time",
+        )
+
+    def test_team_solves_use_partial_index(self):
+        """A team's correct guesses are read from the partial index"""
+        self.assertUsesIndex(
+            Guess.objects.filter(team=self.team, correct=True).order_by("-time"),
+            "guess_team_correct_time",
+        )
+
+
+class TestMarkdownCache(TestCase):
+    """Test caching of rendered Markdown"""
+
+    def setUp(self):
+        markdown_filters.markdown.cache_clear()
+
+    def test_markdown_is_rendered_once_per_text(self):
+        """Rendering the same text again reuses the cached output"""
+        with mock.patch.object(
+            markdown_filters,
+            "convert_markdown",
+            wraps=markdown_filters.convert_markdown,
+        ) as convert_markdown:
+            first = markdown_filters.markdown("Some *puzzle* text")
+            second = markdown_filters.markdown("Some *puzzle* text")
+            markdown_filters.markdown("Other text")
+        self.assertEqual(first, "<p>Some <em>puzzle</em> text</p>")
+        self.assertEqual(first, second)
+        self.assertEqual(convert_markdown.call_count, 2)
+
+    @override_settings(MARKDOWN_CACHE_ALIAS="default")
+    def test_markdown_is_shared_through_cache(self):
+        """With a shared cache configured, other processes' renderings are reused"""
+        cache.clear()
+        markdown_filters.markdown("Shared *text*")
+        markdown_filters.markdown.cache_clear()
+        with mock.patch.object(
+            markdown_filters, "convert_markdown"
+        ) as convert_markdown:
+            output = markdown_filters.markdown("Shared *text*")
+        self.assertEqual(output, "<p>Shared <em>text</em></p>")
+        convert_markdown.assert_not_called()
+
+
+class TestLoadTest(LiveServerTestCase):
+    """Test the loadtest management command against a live server"""
+
+    def setUp(self):
+        ratelimit.reset()
+
+    def test_summarize_percentiles_and_errors(self):
+        """The summary has per-action percentiles, and counts errors but not throttling"""
+        results = Results()
+        for i in range(1, 101):
+            results.add("view_hunt", 200, i / 1000)
+        results.add("guess", 429, 0.01)
+        results.add("guess", 500, 0.01)
+        results.add("guess", None, 0.01)
+        summary = summarize(results, elapsed=2)
+        view_hunt = summary["actions"]["view_hunt"]
+        self.assertAlmostEqual(view_hunt["p50"], 50.5)
+        self.assertAlmostEqual(view_hunt["p99"], 99.01)
+        self.assertEqual(view_hunt["per_second"], 50)
+        self.assertEqual(summary["actions"]["guess"]["errors"], 2)
+        self.assertEqual(summary["actions"]["guess"]["throttled"], 1)
+        self.assertEqual(summary["requests"], 103)
+
+    @override_settings(
+        PASSWORD_HASHERS=["django.contrib.auth.hashers.MD5PasswordHasher"]
+    )
+    def test_loadtest_run(self):
+        """A short run signs up every team, plays without errors and cleans up"""
+        out = StringIO()
+        # the live server's threads share the test database connection, so
+        # requests can't overlap
+        call_command(
+            "loadtest",
+            url=self.live_server_url,
+            teams=1,
+            duration=1,
+            think=0,
+            puzzles=2,
+            json=True,
+            stdout=out,
+        )
+        summary = json.loads(out.getvalue())
+        for action in ["register", "login", "create_team"]:
+            self.assertEqual(summary["actions"][action]["count"], 2)
+        for action, row in summary["actions"].items():
+            self.assertEqual(row["errors"], 0, action)
+        self.assertGreater(summary["requests"], 6)
+        self.assertFalse(Hunt.objects.exists())
+        self.assertFalse(User.objects.exists())
+
+
+class TestQueryCounts(TestCase):
+    """Test that the number of queries each view makes doesn't grow with the data
+
+    Every view is measured on a small hunt, then again after the hunt and the
+    site have grown, and has to make the same number of queries both times,
+    staying under a fixed budget.
+    """
+
+    def setUp(self):
+        cache.clear()
+        ratelimit.reset()
+        self.hunt = Hunt.objects.create(name="Test Hunt", slug="test-hunt")
+        self.organizer = User.objects.create_user(username="organizer")
+        self.hunt.organizers.add(self.organizer)
+        self.user = User.objects.create_user(username="solver")
+        self.team = Team.objects.create(name="Solvers", hunt=self.hunt)
+        self.team.members.add(self.user)
+        # the one puzzle the team never solves
+        self.puzzle = Puzzle.objects.create(
+            name="Open Puzzle", slug="open-puzzle", hunt=self.hunt, answer="OPEN"
+        )
+        self.size = 0
+        self.grow(2)
+
+    def grow(self, count):
+        """Add hunts, puzzles, responses, teams, members, invitations and guesses"""
+        start, self.size = self.size, self.size + count
+        for i in range(start, self.size):
+            other_hunt = Hunt.objects.create(name=f"Hunt {i}", slug=f"hunt-{i}")
+            other_hunt.organizers.add(
+                User.objects.create_user(username=f"organizer-{i}")
+            )
+            Puzzle.objects.create(
+                name=f"Puzzle {i}",
+                slug=f"puzzle-{i}",
+                hunt=self.hunt,
+                answer=f"ANSWER{i}",
+                order=i,
+            )
+            Team.objects.create(name=f"Team {i}", hunt=self.hunt).members.add(
+                User.objects.create_user(username=f"member-{i}")
+            )
+            self.team.members.add(User.objects.create_user(username=f"teammate-{i}"))
+            self.team.invited_members.add(
+                User.objects.create_user(username=f"invitee-{i}")
+            )
+        for puzzle in self.hunt.puzzles.all():
+            for i in range(start, self.size):
+                GuessResponse.objects.create(
+                    puzzle=puzzle, guess=f"CLOSE{i}", response="Keep going"
+                )
+            for team in self.hunt.teams.all():
+                for i in range(start, self.size):
+                    Guess.objects.create(
+                        guess=f"WRONG{i}",
+                        user=self.user,
+                        team=team,
+                        puzzle=puzzle,
+                        correct=False,
+                        counts_as_guess=True,
+                    )
+                if (team, puzzle) == (self.team, self.puzzle):
+                    continue
+                if not team.guesses.filter(puzzle=puzzle, correct=True).exists():
+                    Guess.objects.create(
+                        guess=puzzle.answer,
+                        user=self.user,
+                        team=team,
+                        puzzle=puzzle,
+                        correct=True,
+                        counts_as_guess=True,
+                    )
+
+    def assertQueriesDontGrow(self, max_queries, request):
+        """Make the request before and after growing the data, counting queries"""
+        counts = []
+        for size in [None, 5]:
+            if size:
+                self.grow(size)
+            cache.clear()
+            ratelimit.reset()
+            with CaptureQueriesContext(connection) as queries:
+                res = request()
+            self.assertLess(res.status_code, 400)
+            counts.append(len(queries))
+        self.assertEqual(
+            counts[0],
+            counts[1],
+            "\n".join(query["sql"] for query in queries.captured_queries),
+        )
+        self.assertLessEqual(counts[1], max_queries)
+
+    def puzzle_url(self, view_name):
+        return reverse(
+            view_name,
+            args=[self.hunt.id, self.hunt.slug, self.puzzle.id, self.puzzle.slug],
+        )
+
+    def test_index(self):
+        """The front page lists hunts and their organizers in fixed queries"""
+        self.assertQueriesDontGrow(2, lambda: self.client.get(reverse("index")))
+
+    def test_view_hunt(self):
+        """The hunt page makes a fixed number of queries"""
+        self.client.force_login(self.user)
+        url = reverse("view_hunt", args=[self.hunt.id, self.hunt.slug])
+        self.assertQueriesDontGrow(6, lambda: self.client.get(url))
+
+    def test_view_hunt_as_organizer(self):
+        """The hunt page makes a fixed number of queries for organizers"""
+        self.client.force_login(self.organizer)
+        url = reverse("view_hunt", args=[self.hunt.id, self.hunt.slug])
+        self.assertQueriesDontGrow(5, lambda: self.client.get(url))
+
+    def test_view_puzzle(self):
+        """The puzzle page makes a fixed number of queries"""
+        self.client.force_login(self.user)
+        url = self.puzzle_url("view_puzzle")
+        self.assertQueriesDontGrow(7, lambda: self.client.get(url))
+
+    def test_view_puzzle_guess(self):
+        """Submitting a guess makes a fixed number of queries"""
+        self.hunt.guess_limit = 0
+        self.hunt.save()
+        self.client.force_login(self.user)
+        url = self.puzzle_url("view_puzzle")
+        guesses = iter(["NEW GUESS", "ANOTHER GUESS"])
+        self.assertQueriesDontGrow(
+            10, lambda: self.client.post(url, {"guess": next(guesses)})
+        )
+        self.assertEqual(
+            self.team.guesses.filter(
+                puzzle=self.puzzle, guess__in=["NEWGUESS", "ANOTHERGUESS"]
+            ).count(),
+            2,
+        )
+
+    def test_leaderboard(self):
+        """The leaderboard makes a fixed number of queries"""
+        self.client.force_login(self.user)
+        url = reverse("leaderboard", args=[self.hunt.id, self.hunt.slug])
+        self.assertQueriesDontGrow(5, lambda: self.client.get(url))
+
+    def test_view_puzzle_log(self):
+        """The puzzle log makes a fixed number of queries"""
+        self.client.force_login(self.organizer)
+        url = self.puzzle_url("view_puzzle_log")
+        self.assertQueriesDontGrow(5, lambda: self.client.get(url))
+
+    def test_my_team(self):
+        """The team page makes a fixed number of queries"""
+        self.client.force_login(self.user)
+        url = reverse("my_team", args=[self.hunt.id, self.hunt.slug])
+        self.assertQueriesDontGrow(7, lambda: self.client.get(url))
+
+    def test_my_team_without_team(self):
+        """The team page makes a fixed number of queries for users without a team"""
+        invitee = User.objects.get(username="invitee-0")
+        self.client.force_login(invitee)
+        url = reverse("my_team", args=[self.hunt.id, self.hunt.slug])
+        self.assertQueriesDontGrow(4, lambda: self.client.get(url))
+
+
+class TestBenchmarks(TestCase):
+    """Test the benchmark management command"""
+
+    def run_benchmarks(self, *args):
+        out = StringIO()
+        call_command(
+            "benchmark", *args, min_time=0.001, repeat=1, stdout=out, stderr=StringIO()
+        )
+        return out.getvalue()
+
+    def test_save_and_compare(self):
+        """Results can be saved and compared with, and regressions fail the run"""
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "baseline.json")
+            self.run_benchmarks("--filter", "normalize_answer", "--save", path)
+            with open(path) as f:
+                saved = json.load(f)
+            self.assertEqual(list(saved["results"]), ["normalize_answer"])
+
+            out = self.run_benchmarks(
+                "--filter", "normalize_answer", "--compare", path, "--threshold", "1e6"
+            )
+            self.assertIn("%", out)
+
+            saved["results"]["normalize_answer"] /= 1e9
+            with open(path, "w") as f:
+                json.dump(saved, f)
+            with self.assertRaisesMessage(CommandError, "normalize_answer"):
+                self.run_benchmarks("--filter", "normalize_answer", "--compare", path)
+
+    def test_leaderboard_benchmarks_roll_back(self):
+        """The leaderboard benchmarks leave no hunts or teams behind"""
+        out = self.run_benchmarks("--filter", "leaderboard")
+        self.assertIn("leaderboard (1000 teams)", out)
+        self.assertFalse(Hunt.objects.exists())
+        self.assertFalse(Team.objects.exists())
+
+
+class TestProfiling(TestCase):
+    """Test the opt-in request profiling"""
+
+    def setUp(self):
+        self.hunt = Hunt.objects.create(name="Test Hunt", slug="test-hunt")
+        self.puzzle = Puzzle.objects.create(
+            name="Test Puzzle", slug="test-puzzle", hunt=self.hunt, answer="ANSWER"
+        )
+        self.organizer = User.objects.create_user(username="organizer")
+        self.hunt.organizers.add(self.organizer)
+        self.url = reverse(
+            "view_puzzle",
+            args=[self.hunt.id, self.hunt.slug, self.puzzle.id, self.puzzle.slug],
+        )
+
+    def test_not_profiled_by_default(self):
+        """Requests aren't profiled without a token"""
+        self.client.force_login(self.organizer)
+        res = self.client.get(self.url)
+        self.assertNotIn("Server-Timing", res.headers)
+
+    def test_organizer_token(self):
+        """An organizer's token reports timings in a header and a log line"""
+        self.client.force_login(self.organizer)
+        with self.assertLogs("myus.profiling") as logs:
+            res = self.client.get(self.url, {"profile": profile_token(self.organizer)})
+        self.assertRegex(
+            res.headers["Server-Timing"],
+            r'^total;dur=[\d.]+, db;dur=[\d.]+;desc="[1-9]\d* queries"$',
+        )
+        report = json.loads(logs.records[0].getMessage())
+        self.assertEqual(report["view"], "view_puzzle")
+        self.assertEqual(report["status"], 200)
+        self.assertGreater(report["queries"], 0)
+        self.assertLessEqual(len(report["slowest_queries"]), 3)
+
+    def test_token_only_for_organizers_of_the_hunt(self):
+        """Tokens of other users, or of users who aren't organizers, report nothing"""
+        solver = User.objects.create_user(username="solver")
+        self.client.force_login(solver)
+        for user in [solver, self.organizer]:
+            res = self.client.get(self.url, {"profile": profile_token(user)})
+            self.assertNotIn("Server-Timing", res.headers)
+        res = self.client.get(self.url, {"profile": "forged"})
+        self.assertNotIn("Server-Timing", res.headers)
+
+    def test_profile_link_issues_fresh_token(self):
+        """The hunt page links to a view that hands out a token, rather than including one"""
+        profile_url = reverse("profile_hunt", args=[self.hunt.id, self.hunt.slug])
+        hunt_url = reverse("view_hunt", args=[self.hunt.id, self.hunt.slug])
+        self.client.force_login(self.organizer)
+        res = self.client.get(hunt_url)
+        self.assertContains(res, f'href="{profile_url}"')
+        self.assertNotContains(res, "?profile=")
+
+        with self.assertLogs("myus.profiling"):
+            res = self.client.get(profile_url, follow=True)
+        self.assertEqual(res.redirect_chain[0][0].split("?")[0], hunt_url)
+        self.assertIn("Server-Timing", res.headers)
+
+        self.client.force_login(User.objects.create_user(username="solver"))
+        self.assertEqual(self.client.get(profile_url).status_code, 404)
+
+    async def test_organizer_token_under_asgi(self):
+        """Profiling also works when the middleware runs asynchronously"""
+        await self.async_client.aforce_login(self.organizer)
+        with self.assertLogs("myus.profiling") as logs:
+            res = await self.async_client.get(
+                self.url, {"profile": profile_token(self.organizer)}
+            )
+        self.assertIn("Server-Timing", res.headers)
+        self.assertGreater(json.loads(logs.records[0].getMessage())["queries"], 0)
+
+    @override_settings(PROFILING_ENABLED=True)
+    def test_profiling_enabled(self):
+        """With PROFILING_ENABLED, every request is profiled"""
+        with self.assertLogs("myus.profiling"):
+            res = self.client.get(reverse("index"))
+        self.assertIn("Server-Timing", res.headers)
+
+
+class TestMetrics(TestCase):
+    """Test the Prometheus metrics"""
+
+    def setUp(self):
+        cache.clear()
+        ratelimit.reset()
+        self.hunt = Hunt.objects.create(name="Test Hunt", slug="test-hunt")
+        self.puzzle = Puzzle.objects.create(
+            name="Test Puzzle", slug="test-puzzle", hunt=self.hunt, answer="ANSWER"
+        )
+        self.user = User.objects.create_user(username="solver")
+        self.team = Team.objects.create(name="Team", hunt=self.hunt)
+        self.team.members.add(self.user)
+        self.staff = User.objects.create_user(username="staff", is_staff=True)
+
+    def sample(self, name, labels):
+        return REGISTRY.get_sample_value(name, labels) or 0
+
+    def test_access(self):
+        """Metrics are only served to staff and to requests with the token"""
+        url = reverse("metrics")
+        self.assertEqual(self.client.get(url).status_code, 403)
+        with override_settings(METRICS_TOKEN="secret"):
+            res = self.client.get(url, headers={"Authorization": "Bearer wrong"})
+            self.assertEqual(res.status_code, 403)
+            res = self.client.get(url, headers={"Authorization": "Bearer secret"})
+            self.assertEqual(res.status_code, 200)
+        self.client.force_login(self.staff)
+        res = self.client.get(url)
+        self.assertEqual(res.status_code, 200)
+        self.assertIn("myus_request_duration_seconds", res.content.decode())
+
+    def test_requests_and_guesses(self):
+        """Requests are timed by URL name, and guesses are counted by hunt"""
+        labels = {"hunt": str(self.hunt.id), "correct": "false"}
+        guesses = self.sample("myus_guesses_total", labels)
+        requests = self.sample(
+            "myus_request_duration_seconds_count", {"view": "view_puzzle"}
+        )
+        queries = self.sample("myus_request_queries_sum", {"view": "view_puzzle"})
+
+        self.client.force_login(self.user)
+        self.client.post(
+            reverse(
+                "view_puzzle",
+                args=[self.hunt.id, self.hunt.slug, self.puzzle.id, self.puzzle.slug],
+            ),
+            {"guess": "WRONG"},
+        )
+
+        self.assertEqual(self.sample("myus_guesses_total", labels), guesses + 1)
+        self.assertEqual(
+            self.sample("myus_request_duration_seconds_count", {"view": "view_puzzle"}),
+            requests + 1,
+        )
+        self.assertGreater(
+            self.sample("myus_request_queries_sum", {"view": "view_puzzle"}), queries
+        )
+
+    def test_profiled_queries_are_counted_once(self):
+        """Profiling and metrics share the timing of each query"""
+        organizer = User.objects.create_user(username="organizer")
+        self.hunt.organizers.add(organizer)
+        self.client.force_login(organizer)
+        view = {"view": "view_puzzle"}
+        queries = self.sample("myus_request_queries_sum", view)
+        with self.assertLogs("myus.profiling") as logs:
+            self.client.get(
+                reverse(
+                    "view_puzzle",
+                    args=[
+                        self.hunt.id,
+                        self.hunt.slug,
+                        self.puzzle.id,
+                        self.puzzle.slug,
+                    ],
+                ),
+                {"profile": profile_token(organizer)},
+            )
+        report = json.loads(logs.records[0].getMessage())
+        # the metrics also count the queries of the middleware before profiling
+        self.assertGreaterEqual(
+            self.sample("myus_request_queries_sum", view) - queries, report["queries"]
+        )
+        self.assertEqual(
+            sum(
+                wrapper is instrumentation._time_query
+                for wrapper in connection.execute_wrappers
+            ),
+            1,
+        )
+
+    def test_cache_hits(self):
+        """Cache lookups are counted by kind, like the leaderboard fragment"""
+        url = reverse("leaderboard", args=[self.hunt.id, self.hunt.slug])
+        hit = {"kind": "leaderboard", "result": "hit"}
+        miss = {"kind": "leaderboard", "result": "miss"}
+        hits = self.sample("myus_cache_requests_total", hit)
+        misses = self.sample("myus_cache_requests_total", miss)
+
+        self.client.get(url)
+        self.client.get(url)
+
+        self.assertEqual(self.sample("myus_cache_requests_total", miss), misses + 1)
+        self.assertEqual(self.sample("myus_cache_requests_total", hit), hits + 1)
+
+    def test_active_teams(self):
+        """Teams that guessed recently count as active in their hunt"""
+        Guess.objects.create(
+            guess="WRONG",
+            team=self.team,
+            user=self.user,
+            puzzle=self.puzzle,
+            correct=False,
+            counts_as_guess=True,
+        )
+        self.client.force_login(self.staff)
+        res = self.client.get(reverse("metrics"))
+        self.assertIn(
+            f'myus_active_teams{{hunt="{self.hunt.id}"}} 1.0', res.content.decode()
+        )
+
+
 class TestNewHuntForm(TestCase):
     """Test the NewHuntForm"""
 
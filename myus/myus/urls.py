@@ -37,6 +37,30 @@ urlpatterns = [
         views.leaderboard,
         name="leaderboard",
     ),
+    path("hunt/<int:hunt_id>/stats", views.view_hunt_stats, name="view_hunt_stats"),
+    path(
+        "hunt/<int:hunt_id>-<slug:slug>/stats",
+        views.view_hunt_stats,
+        name="view_hunt_stats",
+    ),
+    path("hunt/<int:hunt_id>/profile", views.profile_hunt, name="profile_hunt"),
+    path(
+        "hunt/<int:hunt_id>-<slug:slug>/profile",
+        views.profile_hunt,
+        name="profile_hunt",
+    ),
+    path("hunt/<int:hunt_id>/guesses", views.export_guesses, name="export_guesses"),
+    path(
+        "hunt/<int:hunt_id>-<slug:slug>/guesses",
+        views.export_guesses,
+        name="export_guesses",
+    ),
+    path("hunt/<int:hunt_id>/events", views.hunt_events, name="hunt_events"),
+    path(
+        "hunt/<int:hunt_id>-<slug:slug>/events",
+        views.hunt_events,
+        name="hunt_events",
+    ),
     # The regex is complicated; it's saying A) the literal "/hunt/", B) a hunt_id made of digits, C) optionally a hyphen and then a hunt slug (made of letters, digits, hyphens, or underscores), D) the literal "/puzzle/", E) a puzzle_id made up of digits, F) optionally a hyphen and then a puzzle slug
     re_path(
         r"^hunt/(?P<hunt_id>\d+)(?:-(?P<hunt_slug>[-\w]+))?/puzzle/(?P<puzzle_id>\d+)(?:-(?P<puzzle_slug>[-\w]+))?$",
@@ -48,10 +72,16 @@ urlpatterns = [
         views.edit_puzzle,
         name="edit_puzzle",
     ),
+    re_path(
+        r"^hunt/(?P<hunt_id>\d+)(?:-(?P<hunt_slug>[-\w]+))?/puzzle/(?P<puzzle_id>\d+)(?:-(?P<puzzle_slug>[-\w]+))?/guess$",
+        views.submit_guess_json,
+        name="submit_guess_json",
+    ),
     re_path(
         r"^hunt/(?P<hunt_id>\d+)(?:-(?P<hunt_slug>[-\w]+))?/puzzle/(?P<puzzle_id>\d+)(?:-(?P<puzzle_slug>[-\w]+))?/log$",
         views.view_puzzle_log,
         name="view_puzzle_log",
     ),
     path("preview_markdown", views.preview_markdown, name="preview_markdown"),
+    path("metrics", views.metrics, name="metrics"),
 ]
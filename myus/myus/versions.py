@@ -0,0 +1,28 @@
+"""Version stamps for cached per-hunt data
+
+Each stamp lives in the cache and is replaced with a fresh value whenever
+the data it covers changes, so anything keyed on the stamp is invalidated
+without having to find and delete the stale entries.
+"""
+
+from time import time_ns
+
+from django.core.cache import cache
+
+LEADERBOARD = "leaderboard"
+# changes that the incrementally refreshed hunt statistics can't follow
+HUNT_STATS = "hunt_stats"
+
+
+def _key(scope, pk):
+    return f"version:{scope}:{pk}"
+
+
+def get_version(scope, pk):
+    # a missing stamp gets a fresh value, so an evicted stamp can never make a
+    # stale entry current again
+    return cache.get_or_set(_key(scope, pk), time_ns, None)
+
+
+def bump_version(scope, pk):
+    cache.set(_key(scope, pk), time_ns(), None)
@@ -1,23 +1,34 @@
-from functools import wraps
+import asyncio
+import hashlib
+import json
+import time
+from datetime import datetime, timezone as dt_timezone
+from functools import cached_property, wraps
 from typing import Optional
+from urllib.parse import urlencode
 
 from django import urls
+from django.conf import settings
 from django.contrib.auth.decorators import login_required
-from django.db.models import OuterRef, Sum, Subquery, Count, Q, F, DurationField
-from django.db.models.functions import Coalesce, Greatest
-from django.http import Http404, JsonResponse
+from django.db.models import Count, Exists, Max, OuterRef, Q, Subquery, Sum
+from django.http import Http404, JsonResponse, StreamingHttpResponse
 from django.http import HttpResponse
+from django.middleware.csrf import get_token
 from django.shortcuts import render, redirect, get_object_or_404
 from django.template.loader import render_to_string
+from django.utils.crypto import constant_time_compare
 from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import condition, require_POST
 from django.core.exceptions import PermissionDenied
-from datetime import timedelta
 
 import django.urls as urls
 import django.forms as forms
 
+from . import events
+from .exports import csv_response, jsonl_response
 from .forms import (
     GuessForm,
+    GuessLogFilterForm,
     NewHuntForm,
     EditHuntForm,
     InviteMemberForm,
@@ -26,12 +37,26 @@ from .forms import (
     TeamForm,
     MarkdownTextarea,
 )
-from .models import Hunt, Team, Puzzle, Guess, ExtraGuessGrant, GuessResponse
+from .guesses import GuessState, asubmit_guess, submit_guess
+from .metrics import latest_metrics
+from .models import (
+    Hunt,
+    Team,
+    Puzzle,
+    Guess,
+    ExtraGuessGrant,
+    GuessResponse,
+    normalize_answer,
+)
+from .profiling import profile_token
+from .ratelimit import aallow_guess, allow_guess
+from .stats import GUESS_BUCKET_LABELS, hunt_stats
+from .versions import LEADERBOARD, get_version
 
 
 def index(request):
     # user = request.user
-    hunts = Hunt.objects.all()
+    hunts = Hunt.objects.prefetch_related("organizers")
     return render(
         request,
         "index.html",
@@ -77,32 +102,92 @@ def new_hunt(request):
     )
 
 
-def get_team(user, hunt):
+def with_hunt_membership(queryset, user, hunt_field="pk"):
+    """Annotate a queryset with the user's organizer status and team in the hunt referenced by hunt_field"""
     if user.is_anonymous:
-        return None
+        return queryset
 
-    try:
-        return Team.objects.get(hunt=hunt, members=user)
-    except Team.DoesNotExist:
-        return None
-    # bad if MultipleObjectsReturned
+    return queryset.annotate(
+        user_is_organizer=Exists(
+            Hunt.organizers.through.objects.filter(hunt=OuterRef(hunt_field), user=user)
+        ),
+        # bad if the user is somehow in several teams for the hunt
+        user_team_id=Subquery(
+            Team.objects.filter(hunt=OuterRef(hunt_field), members=user).values("pk")[
+                :1
+            ]
+        ),
+    )
+
+
+class HuntContext:
+    """The current user's relationship to a hunt, loaded once per request
+
+    The decorators that load the hunt also load the user's organizer status and
+    team ID in the same query (see with_hunt_membership) and store the result on
+    request.hunt_context. The team itself and its extra guess grants are only
+    fetched if a view needs them.
+    """
+
+    def __init__(self, user, hunt, annotated):
+        self.user = user
+        self.hunt = hunt
+        self.is_organizer = getattr(annotated, "user_is_organizer", False)
+        self.team_id = getattr(annotated, "user_team_id", None)
+
+    @cached_property
+    def team(self):
+        if self.team_id is None:
+            return None
+
+        team = Team.objects.get(pk=self.team_id)
+        team.hunt = self.hunt
+        return team
+
+    async def ateam(self):
+        "The team, for async views; it's cached along with the team property"
+        if "team" not in self.__dict__:
+            team = None
+            if self.team_id is not None:
+                team = await Team.objects.aget(pk=self.team_id)
+                team.hunt = self.hunt
+            self.__dict__["team"] = team
+        return self.team
+
+    @cached_property
+    def guess_grants(self):
+        "Extra guesses granted to the team, by puzzle ID"
+        if self.team_id is None:
+            return {}
+
+        return dict(
+            ExtraGuessGrant.objects.filter(team_id=self.team_id).values_list(
+                "puzzle_id", "extra_guesses"
+            )
+        )
 
 
 def redirect_from_hunt_id_to_hunt_id_and_slug(view_func):
     """Redirect from a URL with a hunt ID to a URL with a hunt ID and a slug
 
     Also redirect from a URL with a hunt ID and the wrong slug to the correct slug
+
+    The wrapped view is passed the loaded hunt instead of its ID and slug, and
+    request.hunt_context is set.
     """
 
     @wraps(view_func)
     def wrapper(request, hunt_id: int, *args, slug: Optional[str] = None, **kwargs):
-        hunt = get_object_or_404(Hunt, id=hunt_id)
+        hunt = get_object_or_404(
+            with_hunt_membership(Hunt.objects.all(), request.user), id=hunt_id
+        )
 
         if hunt.slug != slug:
             view_name = urls.resolve(request.path_info).url_name
             return redirect(view_name, hunt.id, hunt.slug)
 
-        return view_func(request, hunt_id, slug, *args, **kwargs)
+        request.hunt_context = HuntContext(request.user, hunt, hunt)
+        return view_func(request, hunt, *args, **kwargs)
 
     return wrapper
 
@@ -111,6 +196,9 @@ def force_url_to_include_both_hunt_and_puzzle_slugs(view_func):
     """Redirect from a URL missing a hunt or puzzle slug to one that includes them
 
     Also redirect from a URL where the ID doesn't match the slug to the correct URL
+
+    The wrapped view is passed the loaded hunt and puzzle instead of their IDs and
+    slugs, and request.hunt_context is set.
     """
 
     @wraps(view_func)
@@ -121,10 +209,16 @@ def force_url_to_include_both_hunt_and_puzzle_slugs(view_func):
         *args,
         hunt_slug: Optional[str] = None,
         puzzle_slug: Optional[str] = None,
-        **kwargs
+        **kwargs,
     ):
-        hunt = get_object_or_404(Hunt, id=hunt_id)
-        puzzle = get_object_or_404(Puzzle, hunt=hunt, id=puzzle_id)
+        puzzle = get_object_or_404(
+            with_hunt_membership(
+                Puzzle.objects.select_related("hunt"), request.user, "hunt"
+            ),
+            hunt_id=hunt_id,
+            id=puzzle_id,
+        )
+        hunt = puzzle.hunt
 
         if hunt.slug != hunt_slug or puzzle.slug != puzzle_slug:
             view_name = urls.resolve(request.path_info).url_name
@@ -136,25 +230,131 @@ def force_url_to_include_both_hunt_and_puzzle_slugs(view_func):
                 puzzle_slug=puzzle.slug,
             )
 
-        return view_func(
-            request,
-            *args,
-            hunt_id=hunt_id,
-            hunt_slug=hunt_slug,
-            puzzle_id=puzzle_id,
-            puzzle_slug=puzzle_slug,
-            **kwargs
-        )
+        request.hunt_context = HuntContext(request.user, hunt, puzzle)
+        return view_func(request, hunt, puzzle, *args, **kwargs)
 
     return wrapper
 
 
+def conditional_page(stamp_func):
+    """Answer conditional GETs for a page from a cheap stamp of what it shows
+
+    stamp_func is called with the view's arguments and returns the values the
+    page depends on, and the latest time any of them changed. The ETag is a
+    hash of those values, the user and their CSRF secret (every page has a form
+    with a token, which is rotated on login), so unchanged pages get a 304
+    before the view runs its queries.
+    """
+
+    def stamp(request, *args, **kwargs):
+        if request.method not in ("GET", "HEAD"):
+            return None, None
+
+        if not hasattr(request, "page_stamp"):
+            parts, last_modified = stamp_func(request, *args, **kwargs)
+            # makes a secret for first visits, so the cookie sent with this
+            # response matches the ETag
+            get_token(request)
+            csrf_secret = request.META["CSRF_COOKIE"]
+            etag = hashlib.sha1(
+                repr((request.user.pk, csrf_secret, *parts)).encode()
+            ).hexdigest()
+            request.page_stamp = (etag, last_modified)
+        return request.page_stamp
+
+    return condition(
+        etag_func=lambda request, *args, **kwargs: stamp(request, *args, **kwargs)[0],
+        last_modified_func=lambda request, *args, **kwargs: stamp(
+            request, *args, **kwargs
+        )[1],
+    )
+
+
+def team_stamp(team):
+    if team is None:
+        return None
+    return (team.id, team.name, team.progress_points, team.last_solve)
+
+
+def hunt_page_stamp(request, hunt: Hunt):
+    context = request.hunt_context
+    # read from the puzzles' counters rather than their guesses
+    puzzles = hunt.puzzles.aggregate(
+        count=Count("id"),
+        updated_at=Max("updated_at"),
+        guesses=Sum("guess_count"),
+        last_solve=Max("last_solve_time"),
+    )
+
+    parts = (
+        context.is_organizer,
+        team_stamp(context.team),
+        hunt.updated_at,
+        puzzles["count"],
+        puzzles["updated_at"],
+        puzzles["guesses"],
+        puzzles["last_solve"],
+    )
+    # wrong guesses only change the guess counts, so they change the ETag but
+    # not the last modified time
+    changes = [hunt.updated_at, puzzles["updated_at"], puzzles["last_solve"]]
+    return parts, max(filter(None, changes))
+
+
+def puzzle_page_stamp(request, hunt: Hunt, puzzle: Puzzle):
+    context = request.hunt_context
+    team = context.team
+    guesses = {"count": 0, "last": None}
+    extra_guesses = None
+    if team:
+        guesses = Guess.objects.filter(team=team, puzzle=puzzle).aggregate(
+            count=Count("id"), last=Max("time")
+        )
+        if hunt.guess_limit:
+            extra_guesses = context.guess_grants.get(puzzle.id)
+
+    parts = (
+        context.is_organizer,
+        team_stamp(team),
+        hunt.updated_at,
+        puzzle.updated_at,
+        guesses["count"],
+        guesses["last"],
+        extra_guesses,
+    )
+    changes = [hunt.updated_at, puzzle.updated_at, guesses["last"]]
+    return parts, max(filter(None, changes))
+
+
+def leaderboard_cache_timeout(hunt: Hunt, is_organizer):
+    # The rendered table is cached under the hunt's leaderboard version, which
+    # changes on every solve; the timeout only bounds staleness from anything else
+    if is_organizer or hunt.leaderboard_style == Hunt.LeaderboardStyle.HIDDEN:
+        return settings.LEADERBOARD_ORGANIZER_CACHE_TIMEOUT
+    return settings.LEADERBOARD_CACHE_TIMEOUT
+
+
+def leaderboard_stamp(request, hunt: Hunt):
+    is_organizer = request.hunt_context.is_organizer
+    version = get_version(LEADERBOARD, hunt.id)
+    # like the cached table, expire the page after the cache timeout
+    timeout = max(leaderboard_cache_timeout(hunt, is_organizer), 1)
+    expiry_period = int(time.time()) // timeout
+
+    parts = (is_organizer, hunt.updated_at, version, expiry_period)
+    changes = [
+        hunt.updated_at,
+        datetime.fromtimestamp(version / 1e9, tz=dt_timezone.utc),
+        datetime.fromtimestamp(expiry_period * timeout, tz=dt_timezone.utc),
+    ]
+    return parts, max(changes)
+
+
 @redirect_from_hunt_id_to_hunt_id_and_slug
-def view_hunt(request, hunt_id: int, slug: Optional[str] = None):
-    user = request.user
-    hunt = get_object_or_404(Hunt, id=hunt_id)
-    team = get_team(user, hunt)
-    is_organizer = user.is_authenticated and hunt.organizers.filter(id=user.id).exists()
+@conditional_page(hunt_page_stamp)
+def view_hunt(request, hunt: Hunt):
+    team = request.hunt_context.team
+    is_organizer = request.hunt_context.is_organizer
 
     if is_organizer:
         puzzles = hunt.puzzles.all()
@@ -163,11 +363,6 @@ def view_hunt(request, hunt_id: int, slug: Optional[str] = None):
     else:
         puzzles = hunt.public_puzzles()
 
-    puzzles = puzzles.annotate(
-        solve_count=Count("guesses", filter=Q(guesses__correct=True)),
-        guess_count=Count("guesses"),
-    )
-
     return render(
         request,
         "view_hunt.html",
@@ -181,49 +376,31 @@ def view_hunt(request, hunt_id: int, slug: Optional[str] = None):
 
 
 @redirect_from_hunt_id_to_hunt_id_and_slug
-def leaderboard(request, hunt_id: int, slug: Optional[str] = None):
-    user = request.user
-    hunt = get_object_or_404(Hunt, id=hunt_id)
-    team = get_team(user, hunt)
-    is_organizer = user.is_authenticated and hunt.organizers.filter(id=user.id).exists()
-
-    # for the sake of simplicity, assume teams won't end up with two correct guesses for a puzzle
-    teams = hunt.teams.annotate(
-        score=Coalesce(
-            Subquery(
-                Guess.objects.filter(
-                    team=OuterRef("pk"),
-                    correct=True,
-                )
-                .values("team")
-                .annotate(score=Sum("puzzle__points"))
-                .values("score")
-            ),
-            0,
-        ),
-        solve_count=Count("guesses", filter=Q(guesses__correct=True)),
-        last_solve=Subquery(
-            Guess.objects.filter(
-                team=OuterRef("pk"),
-                correct=True,
-            )
-            .order_by("-time")[:1]
-            .values("time")
-        ),
-        created_or_start=Greatest(F("creation_time"), hunt.start_time),
-        solve_time=Greatest(
-            Coalesce(F("last_solve"), F("created_or_start")) - F("created_or_start"),
-            timedelta(seconds=0),
-            output_field=DurationField(),
-        ),
-    )
+def profile_hunt(request, hunt: Hunt):
+    """Send an organizer to the hunt page with a fresh profiling token
+
+    The token isn't put on the hunt page itself, which can be revalidated
+    with a 304 long after the token has expired.
+    """
+    if not request.hunt_context.is_organizer:
+        raise Http404("Only organizers can profile the hunt")
+
+    url = urls.reverse("view_hunt", args=[hunt.id, hunt.slug])
+    return redirect(f"{url}?{urlencode({'profile': profile_token(request.user)})}")
+
+
+@redirect_from_hunt_id_to_hunt_id_and_slug
+@conditional_page(leaderboard_stamp)
+def leaderboard(request, hunt: Hunt):
+    team = request.hunt_context.team
+    is_organizer = request.hunt_context.is_organizer
+
+    # standings are maintained on the teams as guesses come in
+    teams = hunt.leaderboard_teams()
 
-    #   print(teams.query)
     if hunt.leaderboard_style == Hunt.LeaderboardStyle.SPEEDRUN:
-        teams = teams.order_by("-score", "solve_time", "last_solve")
         template = "leaderboard_SPD.html"
     else:
-        teams = teams.order_by("-score", "-solve_count", "last_solve")
         template = "leaderboard.html"
 
     return render(
@@ -234,96 +411,107 @@ def leaderboard(request, hunt_id: int, slug: Optional[str] = None):
             "team": team,
             "teams": teams,
             "is_organizer": is_organizer,
+            "cache_timeout": leaderboard_cache_timeout(hunt, is_organizer),
+            "leaderboard_version": get_version(LEADERBOARD, hunt.id),
         },
     )
 
 
-def normalize_answer(answer):
-    return "".join(c for c in answer if c.isalnum()).upper()
+def hunt_event_messages(event, hunt, is_organizer, team_id):
+    """Format a hunt event as the server-sent event messages a viewer may see"""
+    messages = []
+    if event["type"] == "solve":
+        if is_organizer or hunt.leaderboard_style != Hunt.LeaderboardStyle.HIDDEN:
+            messages.append(("leaderboard", event["team"]))
+        if is_organizer or event["team"]["id"] == team_id:
+            messages.append(
+                ("solve", {"team": event["team"]["name"], "puzzle": event["puzzle"]})
+            )
+
+    return [
+        "event: {}\ndata: {}\n\n".format(name, json.dumps(data))
+        for name, data in messages
+    ]
+
+
+async def hunt_events(request, hunt_id: int, slug: Optional[str] = None):
+    """Stream leaderboard changes, and solves by the viewer's team, as server-sent events"""
+    user = await request.auser()
+    hunt = (
+        await with_hunt_membership(Hunt.objects.all(), user).filter(id=hunt_id).afirst()
+    )
+    if hunt is None:
+        raise Http404("Hunt does not exist")
+
+    hunt_context = HuntContext(user, hunt, hunt)
+    is_organizer = hunt_context.is_organizer
+    team_id = hunt_context.team_id
+
+    async def stream():
+        # end the stream now and then; browsers reconnect by themselves
+        deadline = time.monotonic() + settings.EVENT_STREAM_MAX_AGE
+        async with events.get_broker().subscribe(hunt.id) as queue:
+            yield "retry: 5000\n\n"
+            while (remaining := deadline - time.monotonic()) > 0:
+                try:
+                    event = await asyncio.wait_for(
+                        queue.get(), min(settings.EVENT_STREAM_KEEPALIVE, remaining)
+                    )
+                except asyncio.TimeoutError:
+                    yield ": keepalive\n\n"
+                    continue
+
+                for message in hunt_event_messages(event, hunt, is_organizer, team_id):
+                    yield message
+
+    response = StreamingHttpResponse(stream(), content_type="text/event-stream")
+    response["Cache-Control"] = "no-cache"
+    response["X-Accel-Buffering"] = "no"
+    return response
+
+
+TOO_MANY_GUESSES = "You're guessing too quickly! Wait a minute and try again."
 
 
 @force_url_to_include_both_hunt_and_puzzle_slugs
-def view_puzzle(
-    request,
-    hunt_id: int,
-    puzzle_id: int,
-    hunt_slug: Optional[str] = None,
-    puzzle_slug: Optional[str] = None,
-):
+@conditional_page(puzzle_page_stamp)
+def view_puzzle(request, hunt: Hunt, puzzle: Puzzle):
     user = request.user
-    hunt = get_object_or_404(Hunt, id=hunt_id)
-    puzzle = get_object_or_404(Puzzle, hunt=hunt, id=puzzle_id)
-    team = get_team(user, hunt)
 
-    is_organizer = user.is_authenticated and hunt.organizers.filter(id=user.id).exists()
+    # throttle guesses before anything else touches the database; the team ID
+    # comes with the puzzle, so this doesn't load the team
+    if (
+        request.method == "POST"
+        and request.hunt_context.team_id is not None
+        and not allow_guess(user.pk, request.hunt_context.team_id, puzzle.id)
+    ):
+        return render(
+            request,
+            "too_many_guesses.html",
+            {"hunt": hunt, "puzzle": puzzle, "error": TOO_MANY_GUESSES},
+            status=429,
+        )
+
+    team = request.hunt_context.team
+    is_organizer = request.hunt_context.is_organizer
 
     if not is_organizer and not puzzle.is_viewable_by(team):
         raise Http404("Puzzle is not viewable by team (or the public)")
 
-    if team:
-        solved = Guess.objects.filter(puzzle=puzzle, team=team, correct=True).exists()
-
-        guess_limit = hunt.guess_limit
-        guesses_limited = bool(guess_limit)
-
-        if guesses_limited:
-            try:
-                grant = ExtraGuessGrant.objects.get(team=team, puzzle=puzzle)
-                guess_limit += grant.extra_guesses
-            except ExtraGuessGrant.DoesNotExist:
-                pass
-
-            guesses_remaining = (
-                guess_limit
-                - Guess.objects.filter(
-                    puzzle=puzzle, team=team, counts_as_guess=True
-                ).count()
-            )
-            guesses_at_limit = guesses_remaining <= 0
-        else:
-            # hunt doesn't limit guesses
-            guesses_remaining = 0
-            guesses_at_limit = False
-    else:
-        solved = False
-        guesses_limited = None
-        guesses_remaining = 0
-        guesses_at_limit = False
+    guess_state = GuessState.load(request.hunt_context, puzzle)
+    solved = guess_state.solved
 
     if request.method == "POST":
         guess_form = GuessForm(request.POST)
 
-        if solved:
-            error = "You have already solved the puzzle!"
-        elif not guesses_at_limit and guess_form.is_valid():
+        if team and guess_form.is_valid():
             guess_text = normalize_answer(guess_form.cleaned_data["guess"])
-            if Guess.objects.filter(
-                guess=guess_text, team=team, puzzle=puzzle
-            ).exists():
-                guess_form.add_error("guess", "You have already guessed that answer!")
+            error = guess_state.error_for(guess_text)
+            if error:
+                guess_form.add_error("guess", error)
             else:
-                guess_responses = puzzle.guess_responses.all()
-                response = ""
-                counts_as_guess = True
-                for gr in guess_responses:
-                    if guess_text == normalize_answer(gr.guess):
-                        response = gr.response
-                        counts_as_guess = False
-                guess = Guess(
-                    guess=guess_text,
-                    team=team,
-                    user=user,
-                    puzzle=puzzle,
-                    response=response,
-                    counts_as_guess=counts_as_guess,
-                    correct=(guess_text == normalize_answer(puzzle.answer)),
-                )
-                guess.save()
-
-                if guess.correct:
-                    solved = True
-
-                return redirect(urls.reverse("view_puzzle", args=[hunt_id, puzzle_id]))
+                submit_guess(team, user, puzzle, guess_text)
+                return redirect(urls.reverse("view_puzzle", args=[hunt.id, puzzle.id]))
     else:
         guess_form = GuessForm()
 
@@ -343,50 +531,213 @@ def view_puzzle(
             "puzzle": puzzle,
             "solved": solved,
             "show_solution": show_solution,
-            "guesses_limited": guesses_limited,
-            "guesses_remaining": guesses_remaining,
-            "guesses_at_limit": guesses_at_limit,
-            "guesses": Guess.objects.filter(team=team, puzzle=puzzle).order_by("time"),
+            "guesses_limited": guess_state.guesses_limited,
+            "guesses_remaining": guess_state.guesses_remaining,
+            "guesses_at_limit": guess_state.guesses_at_limit,
+            "guesses": guess_state.guesses,
             "guess_form": guess_form,
             "is_organizer": is_organizer,
         },
     )
 
 
-@force_url_to_include_both_hunt_and_puzzle_slugs
-def view_puzzle_log(
+@require_POST
+async def submit_guess_json(
     request,
     hunt_id: int,
     puzzle_id: int,
     hunt_slug: Optional[str] = None,
     puzzle_slug: Optional[str] = None,
 ):
-    user = request.user
-    hunt = get_object_or_404(Hunt, id=hunt_id)
-    puzzle = get_object_or_404(Puzzle, hunt=hunt, id=puzzle_id)
+    """Submit a guess like view_puzzle does, but asynchronously and answering in JSON"""
+    user = await request.auser()
+    if user.is_anonymous:
+        return JsonResponse(
+            {"success": False, "error": "You are not logged in!"}, status=403
+        )
+
+    puzzle = await (
+        with_hunt_membership(Puzzle.objects.select_related("hunt"), user, "hunt")
+        .filter(hunt_id=hunt_id, id=puzzle_id)
+        .afirst()
+    )
+    if puzzle is None:
+        return JsonResponse(
+            {"success": False, "error": "Puzzle does not exist"}, status=404
+        )
+    hunt_context = HuntContext(user, puzzle.hunt, puzzle)
+
+    if hunt_context.team_id is not None and not await aallow_guess(
+        user.pk, hunt_context.team_id, puzzle.id
+    ):
+        return JsonResponse(
+            {"success": False, "error": TOO_MANY_GUESSES},
+            status=429,
+        )
 
-    is_organizer = user.is_authenticated and hunt.organizers.filter(id=user.id).exists()
+    team = await hunt_context.ateam()
+    if not team:
+        return JsonResponse(
+            {
+                "success": False,
+                "error": "You aren't in a team signed up for this hunt!",
+            },
+            status=403,
+        )
+    if not puzzle.is_viewable_by(team):
+        return JsonResponse(
+            {"success": False, "error": "Puzzle is not viewable by team"}, status=404
+        )
 
-    if not is_organizer:
+    guess_form = GuessForm(request.POST)
+    if not guess_form.is_valid():
+        return JsonResponse(
+            {"success": False, "error": guess_form.errors.get_json_data()}, status=400
+        )
+
+    guess_text = normalize_answer(guess_form.cleaned_data["guess"])
+    guess_state = await GuessState.aload(hunt_context, puzzle)
+    error = guess_state.error_for(guess_text)
+    if error:
+        return JsonResponse({"success": False, "error": error}, status=400)
+
+    guess = await asubmit_guess(team, user, puzzle, guess_text)
+    guesses_remaining = None
+    if guess_state.guesses_limited:
+        guesses_remaining = guess_state.guesses_remaining - guess.counts_as_guess
+
+    return JsonResponse(
+        {
+            "success": True,
+            "guess": guess.guess,
+            "correct": guess.correct,
+            "response": guess.response,
+            "guesses_remaining": guesses_remaining,
+        }
+    )
+
+
+PUZZLE_LOG_PAGE_SIZE = 100
+
+
+@force_url_to_include_both_hunt_and_puzzle_slugs
+def view_puzzle_log(request, hunt: Hunt, puzzle: Puzzle):
+    if not request.hunt_context.is_organizer:
         raise Http404("Puzzle stats are only viewable by organizers")
 
+    filter_form = GuessLogFilterForm(hunt, request.GET)
+    if not filter_form.is_valid():
+        return HttpResponse(status=400)
+    guesses = filter_form.filter(Guess.objects.filter(puzzle=puzzle))
+
+    if request.GET.get("format") == "csv":
+        return csv_response(
+            request,
+            f"{hunt.slug}-{puzzle.slug}-log.csv",
+            ["Team", "User", "Guess", "Response", "Time", "Correct?"],
+            guesses.order_by("time", "id").values_list(
+                "team__name", "user__username", "guess", "response", "time", "correct"
+            ),
+        )
+
+    # Pages are keyed on the (time, id) of the last guess shown, so every page
+    # is an index range scan however deep it is
+    after = request.GET.get("after")
+    if after:
+        try:
+            after_time, after_id = after.rsplit("_", 1)
+            after_time = datetime.fromisoformat(after_time)
+            after_id = int(after_id)
+        except ValueError:
+            return HttpResponse(status=400)
+        guesses = guesses.filter(
+            Q(time__gt=after_time) | Q(time=after_time, id__gt=after_id)
+        )
+
+    page = list(
+        guesses.select_related("team").order_by("time", "id")[
+            : PUZZLE_LOG_PAGE_SIZE + 1
+        ]
+    )
+    next_page = None
+    if len(page) > PUZZLE_LOG_PAGE_SIZE:
+        page = page[:PUZZLE_LOG_PAGE_SIZE]
+        params = request.GET.copy()
+        params["after"] = f"{page[-1].time.isoformat()}_{page[-1].id}"
+        next_page = params.urlencode()
+
+    first_page = request.GET.copy()
+    first_page.pop("after", None)
+    csv_params = first_page.copy()
+    csv_params["format"] = "csv"
+
     return render(
         request,
         "view_puzzle_log.html",
         {
             "hunt": hunt,
             "puzzle": puzzle,
-            "guesses": Guess.objects.filter(puzzle=puzzle).order_by("time"),
+            "guesses": page,
+            "filter_form": filter_form,
+            "next_page": next_page,
+            "first_page": first_page.urlencode() if after else None,
+            "csv_params": csv_params.urlencode(),
         },
     )
 
 
+@redirect_from_hunt_id_to_hunt_id_and_slug
+def view_hunt_stats(request, hunt: Hunt):
+    if not request.hunt_context.is_organizer:
+        raise Http404("Hunt stats are only viewable by organizers")
+
+    return render(
+        request,
+        "view_hunt_stats.html",
+        {
+            "hunt": hunt,
+            "puzzle_stats": hunt_stats(hunt),
+            "guess_buckets": GUESS_BUCKET_LABELS,
+        },
+    )
+
+
+# (name, lookup) of the columns in a hunt's guess export
+GUESS_EXPORT_FIELDS = [
+    ("team", "team__name"),
+    ("user", "user__username"),
+    ("puzzle", "puzzle__name"),
+    ("guess", "guess"),
+    ("correct", "correct"),
+    ("response", "response"),
+    ("time", "time"),
+]
+
+
+@redirect_from_hunt_id_to_hunt_id_and_slug
+def export_guesses(request, hunt: Hunt):
+    """Stream every guess in the hunt as CSV, or JSON Lines with ?format=jsonl"""
+    if not request.hunt_context.is_organizer:
+        raise Http404("Guesses are only exportable by organizers")
+
+    names = [name for name, _ in GUESS_EXPORT_FIELDS]
+    # guesses are numbered in time order, so this avoids sorting the table
+    rows = (
+        Guess.objects.filter(puzzle__hunt=hunt)
+        .order_by("id")
+        .values_list(*[lookup for _, lookup in GUESS_EXPORT_FIELDS])
+    )
+
+    if request.GET.get("format") == "jsonl":
+        return jsonl_response(request, f"{hunt.slug}-guesses.jsonl", names, rows)
+    return csv_response(request, f"{hunt.slug}-guesses.csv", names, rows)
+
+
 @login_required
 @redirect_from_hunt_id_to_hunt_id_and_slug
-def my_team(request, hunt_id: int, slug: Optional[str] = None):
+def my_team(request, hunt: Hunt):
     user = request.user
-    hunt = get_object_or_404(Hunt, id=hunt_id)
-    team = get_team(user, hunt)
+    team = request.hunt_context.team
     error = None
 
     create_team_form = TeamForm()
@@ -404,7 +755,7 @@ def my_team(request, hunt_id: int, slug: Optional[str] = None):
                     team.save()
                     team.members.add(user)
 
-                    return redirect(urls.reverse("my_team", args=[hunt_id]))
+                    return redirect(urls.reverse("my_team", args=[hunt.id]))
         elif "invite_member" in request.POST:
             invite_member_form = InviteMemberForm(request.POST)
             if not team:
@@ -429,7 +780,7 @@ def my_team(request, hunt_id: int, slug: Optional[str] = None):
                     else:
                         team.invited_members.add(user_to_invite)
 
-                        return redirect(urls.reverse("my_team", args=[hunt_id]))
+                        return redirect(urls.reverse("my_team", args=[hunt.id]))
         elif "accept_invite" in request.POST:
             if team:
                 error = (
@@ -442,7 +793,7 @@ def my_team(request, hunt_id: int, slug: Optional[str] = None):
                         inviting_team.members.add(user)
                         inviting_team.invited_members.remove(user)
 
-                        return redirect(urls.reverse("my_team", args=[hunt_id]))
+                        return redirect(urls.reverse("my_team", args=[hunt.id]))
                     else:
                         error = "You don't have an invitation to that team!"
                 except Team.DoesNotExist:
@@ -462,8 +813,7 @@ def my_team(request, hunt_id: int, slug: Optional[str] = None):
                 if user.is_authenticated
                 else []
             ),
-            "is_organizer": not user.is_anonymous
-            and hunt.organizers.filter(id=user.id).exists(),
+            "is_organizer": request.hunt_context.is_organizer,
         },
     )
 
@@ -476,14 +826,12 @@ class GuessResponseForm(forms.ModelForm):
 
 @redirect_from_hunt_id_to_hunt_id_and_slug
 @login_required
-def new_puzzle(request, hunt_id: int, slug: Optional[str] = None):
+def new_puzzle(request, hunt: Hunt):
     PuzzleFormSet = forms.inlineformset_factory(
         Puzzle, GuessResponse, form=GuessResponseForm, extra=1, can_delete=True
     )
-    user = request.user
-    hunt = get_object_or_404(Hunt, id=hunt_id)
 
-    if not hunt.organizers.filter(id=user.id).exists():
+    if not request.hunt_context.is_organizer:
         return HttpResponse(status=403)
 
     if request.method == "POST":
@@ -515,20 +863,11 @@ def new_puzzle(request, hunt_id: int, slug: Optional[str] = None):
 
 @force_url_to_include_both_hunt_and_puzzle_slugs
 @login_required
-def edit_puzzle(
-    request,
-    hunt_id: int,
-    puzzle_id: int,
-    hunt_slug: Optional[str] = None,
-    puzzle_slug: Optional[str] = None,
-):
+def edit_puzzle(request, hunt: Hunt, puzzle: Puzzle):
     PuzzleFormSet = forms.inlineformset_factory(
         Puzzle, GuessResponse, form=GuessResponseForm, extra=1, can_delete=True
     )
-    user = request.user
-    hunt = get_object_or_404(Hunt, id=hunt_id)
-    puzzle = get_object_or_404(Puzzle, hunt=hunt, id=puzzle_id)
-    if not hunt.organizers.filter(id=user.id).exists():
+    if not request.hunt_context.is_organizer:
         return HttpResponse(status=403)
 
     if request.method == "POST":
@@ -558,14 +897,8 @@ def edit_puzzle(
 
 @login_required
 @redirect_from_hunt_id_to_hunt_id_and_slug
-def edit_hunt(
-    request,
-    hunt_id: int,
-    slug: Optional[str] = None,
-):
-    user = request.user
-    hunt = get_object_or_404(Hunt, id=hunt_id)
-    if not hunt.organizers.filter(id=user.id).exists():
+def edit_hunt(request, hunt: Hunt):
+    if not request.hunt_context.is_organizer:
         raise PermissionDenied
 
     if request.method == "POST":
@@ -603,3 +936,16 @@ def preview_markdown(request):
             "error": "No markdown input received",
         }
     )
+
+
+def metrics(request):
+    """The Prometheus metrics, for staff and for scrapers with the METRICS_TOKEN"""
+    authorization = request.headers.get("Authorization", "")
+    has_token = settings.METRICS_TOKEN and constant_time_compare(
+        authorization, f"Bearer {settings.METRICS_TOKEN}"
+    )
+    if not (has_token or request.user.is_staff):
+        return HttpResponse(status=403)
+
+    content, content_type = latest_metrics()
+    return HttpResponse(content, content_type=content_type)
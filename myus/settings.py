@@ -59,12 +59,19 @@ INSTALLED_APPS = [
     "django.contrib.staticfiles",
 ]
 
+# WhiteNoiseMiddleware (as of 6.8) only runs synchronously, so under ASGI every
+# request, not only for static files, is handed to a thread to pass through it
+# and back to the event loop for the rest. If that ever matters, serve the
+# static files from the proxy or a CDN and remove it.
 MIDDLEWARE = [
+    "myus.metrics.MetricsMiddleware",
     "django.middleware.security.SecurityMiddleware",
+    "whitenoise.middleware.WhiteNoiseMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
     "django.contrib.auth.middleware.AuthenticationMiddleware",
+    "myus.profiling.ProfilingMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
 ]
@@ -92,12 +99,117 @@ WSGI_APPLICATION = "wsgi.application"
 SECRET_KEY = os.getenv("SECRET_KEY")
 POSTGRES_URL = os.getenv("DATABASE_URL")
 
+
+def env_flag(name, default=False):
+    value = os.getenv(name)
+    if not value:
+        return default
+    return value.lower() in ("1", "true", "yes", "on")
+
+
+# Connections are kept open for DATABASE_CONN_MAX_AGE seconds (0 closes them
+# after every request) and checked before being reused. DATABASE_SSL_REQUIRE
+# can be turned off for a local database, e.g. sqlite:///db.sqlite3.
+# https://docs.djangoproject.com/en/5.1/ref/databases/#persistent-connections
 DATABASES = {
     "default": dj_database_url.config(
-        default=POSTGRES_URL, conn_max_age=0, ssl_require=True
+        default=POSTGRES_URL,
+        conn_max_age=int(os.getenv("DATABASE_CONN_MAX_AGE") or 60),
+        conn_health_checks=env_flag("DATABASE_CONN_HEALTH_CHECKS", True),
+        ssl_require=env_flag("DATABASE_SSL_REQUIRE", True),
     ),
 }
 
+# For PostgreSQL, a psycopg 3 connection pool shared by the threads of each
+# process is used instead, unless DATABASE_POOL is turned off. Under ASGI (as
+# in the Dockerfile) persistent connections don't help: Django runs each
+# request's database work in a new thread, which opens its own connection.
+# https://docs.djangoproject.com/en/5.1/ref/databases/#connection-pool
+if env_flag(
+    "DATABASE_POOL",
+    DATABASES["default"].get("ENGINE") == "django.db.backends.postgresql",
+):
+    DATABASES["default"]["CONN_MAX_AGE"] = 0
+    DATABASES["default"].setdefault("OPTIONS", {})["pool"] = {
+        "min_size": int(os.getenv("DATABASE_POOL_MIN_SIZE") or 1),
+        "max_size": int(os.getenv("DATABASE_POOL_MAX_SIZE") or 4),
+        "timeout": int(os.getenv("DATABASE_POOL_TIMEOUT") or 10),
+    }
+
+# Needed behind a transaction-pooling proxy such as PgBouncer
+DATABASES["default"]["DISABLE_SERVER_SIDE_CURSORS"] = env_flag(
+    "DATABASE_DISABLE_SERVER_SIDE_CURSORS"
+)
+
+# Set CACHE_BACKEND/CACHE_LOCATION to a cache shared by all workers (e.g. the
+# file-based or Redis backends) when running more than one process; the default
+# local-memory cache is per-process. It's wrapped to count hits and misses for
+# the metrics.
+# https://docs.djangoproject.com/en/5.1/topics/cache/
+
+CACHES = {
+    "default": {
+        "BACKEND": "myus.metrics.MeteredCache",
+        "LOCATION": os.getenv("CACHE_LOCATION", ""),
+        "OPTIONS": {
+            "BACKEND": os.getenv("CACHE_BACKEND")
+            or "django.core.cache.backends.locmem.LocMemCache",
+        },
+    },
+}
+
+# How long (in seconds) a rendered leaderboard may be served after a change other
+# than a solve (solves always invalidate it). Organizers and hidden leaderboards
+# get a separate, normally shorter, bound.
+LEADERBOARD_CACHE_TIMEOUT = int(os.getenv("LEADERBOARD_CACHE_TIMEOUT") or 60)
+LEADERBOARD_ORGANIZER_CACHE_TIMEOUT = int(
+    os.getenv("LEADERBOARD_ORGANIZER_CACHE_TIMEOUT") or 5
+)
+
+# Rendered Markdown is cached per process in an LRU cache of this many entries
+# per filter, and optionally shared between processes through the named cache.
+MARKDOWN_CACHE_SIZE = int(os.getenv("MARKDOWN_CACHE_SIZE") or 256)
+MARKDOWN_CACHE_ALIAS = os.getenv("MARKDOWN_CACHE_ALIAS") or None
+MARKDOWN_CACHE_TIMEOUT = int(os.getenv("MARKDOWN_CACHE_TIMEOUT") or 24 * 60 * 60)
+
+# Organizers' hunt statistics are refreshed incrementally from new guesses, and
+# rebuilt from scratch at least this often (in seconds).
+HUNT_STATS_CACHE_TIMEOUT = int(os.getenv("HUNT_STATS_CACHE_TIMEOUT") or 60 * 60)
+
+# Live hunt events (see myus/events.py). The default broker only reaches
+# listeners in the same process. Streams send a keepalive comment every
+# EVENT_STREAM_KEEPALIVE seconds and are closed after EVENT_STREAM_MAX_AGE
+# seconds, after which browsers reconnect.
+EVENT_BROKER = os.getenv("EVENT_BROKER") or "myus.events.LocalBroker"
+EVENT_STREAM_KEEPALIVE = int(os.getenv("EVENT_STREAM_KEEPALIVE") or 15)
+EVENT_STREAM_MAX_AGE = int(os.getenv("EVENT_STREAM_MAX_AGE") or 300)
+
+# Guess rate limits (see myus/ratelimit.py): each user, and each team on each
+# puzzle, may make bursts of up to *_BURST guesses, refilled at *_PER_MINUTE
+# guesses a minute (0 disables the limit). The buckets are kept per process
+# unless GUESS_RATE_CACHE_ALIAS names a cache to share them through.
+GUESS_RATE_USER_BURST = int(os.getenv("GUESS_RATE_USER_BURST") or 20)
+GUESS_RATE_USER_PER_MINUTE = int(os.getenv("GUESS_RATE_USER_PER_MINUTE") or 30)
+GUESS_RATE_TEAM_BURST = int(os.getenv("GUESS_RATE_TEAM_BURST") or 10)
+GUESS_RATE_TEAM_PER_MINUTE = int(os.getenv("GUESS_RATE_TEAM_PER_MINUTE") or 10)
+GUESS_RATE_CACHE_ALIAS = os.getenv("GUESS_RATE_CACHE_ALIAS") or None
+
+# Request profiling (see myus/profiling.py): PROFILING_ENABLED reports the time
+# and queries of every request in a Server-Timing header and on the
+# myus.profiling logger; otherwise organizers can profile single pages with a
+# token that lasts PROFILING_TOKEN_MAX_AGE seconds. Log lines list the
+# PROFILING_SLOWEST_QUERIES slowest queries.
+PROFILING_ENABLED = env_flag("PROFILING_ENABLED")
+PROFILING_TOKEN_MAX_AGE = int(os.getenv("PROFILING_TOKEN_MAX_AGE") or 24 * 60 * 60)
+PROFILING_SLOWEST_QUERIES = int(os.getenv("PROFILING_SLOWEST_QUERIES") or 3)
+
+# Prometheus metrics (see myus/metrics.py) are served at /metrics to staff, and
+# to scrapers sending "Authorization: Bearer <METRICS_TOKEN>" if it's set.
+# Teams count as active if they guessed in the last METRICS_ACTIVE_TEAM_WINDOW
+# seconds.
+METRICS_TOKEN = os.getenv("METRICS_TOKEN") or None
+METRICS_ACTIVE_TEAM_WINDOW = int(os.getenv("METRICS_ACTIVE_TEAM_WINDOW") or 5 * 60)
+
 AUTH_USER_MODEL = "myus.User"
 
 # Password validation
@@ -197,5 +309,10 @@ LOGGING = {
             "level": "INFO",
             "propagate": True,
         },
+        "myus.profiling": {
+            "handlers": ["django"],
+            "level": "INFO",
+            "propagate": False,
+        },
     },
 }